@@ -34,7 +34,7 @@ async def get_current_user(
         logger.warning("Token验证失败: 缺少用户名")
         raise credentials_exception
 
-    user = user_repo.get_by_username(username)
+    user = await user_repo.aget_by_username(username)
     if user is None:
         logger.warning(f"Token验证失败: 用户不存在 - {username}")
         raise credentials_exception
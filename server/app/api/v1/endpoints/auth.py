@@ -15,14 +15,14 @@ user_repo = UserRepository()
 async def register(user_data: UserCreate):
     logger.info(f"注册请求: username={user_data.username}, email={user_data.email}")
 
-    if user_repo.username_exists(user_data.username):
+    if await user_repo.ausername_exists(user_data.username):
         logger.warning(f"注册失败: 用户名已存在 - {user_data.username}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="用户名已存在"
         )
 
-    if user_repo.email_exists(user_data.email):
+    if await user_repo.aemail_exists(user_data.email):
         logger.warning(f"注册失败: 邮箱已被注册 - {user_data.email}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -30,7 +30,7 @@ async def register(user_data: UserCreate):
         )
 
     hashed_password = get_password_hash(user_data.password)
-    new_user = user_repo.create(
+    new_user = await user_repo.acreate(
         username=user_data.username,
         email=user_data.email,
         hashed_password=hashed_password,
@@ -45,7 +45,7 @@ async def register(user_data: UserCreate):
 @router.post("/login", response_model=Token)
 async def login(user_data: UserLogin):
     logger.info(f"登录请求: username={user_data.username}")
-    user = user_repo.get_by_username(user_data.username)
+    user = await user_repo.aget_by_username(user_data.username)
 
     if not user or not verify_password(user_data.password, user.hashed_password):
         logger.warning(f"登录失败: 账号或密码错误 - {user_data.username}")
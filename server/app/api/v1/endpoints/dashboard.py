@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from typing import List, Optional
 from app.core.logging_config import get_logger
+from app.core.config import settings
+from app.core.database import unit_of_work
+from app.core.response_cache import response_cache, DASHBOARD_CACHE_NAMESPACE
 from app.models.case import Case, Agent, SystemHealth, DashboardStats
 from app.schemas.case import (
     DashboardDataResponse,
     DashboardStatsResponse,
+    DashboardTrendBucketResponse,
     CaseResponse,
     AgentResponse,
     SystemHealthResponse,
@@ -12,7 +16,11 @@ from app.schemas.case import (
 from app.repositories.case_repository import CaseRepository
 from app.repositories.agent_repository import AgentRepository
 from app.repositories.system_health_repository import SystemHealthRepository
-from app.repositories.dashboard_stats_repository import DashboardStatsRepository
+from app.repositories.dashboard_stats_repository import (
+    DashboardStatsRepository,
+    ROLLUP_GRANULARITIES,
+    format_duration,
+)
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -23,27 +31,42 @@ stats_repo = DashboardStatsRepository()
 
 
 @router.get("", response_model=DashboardDataResponse)
-def get_dashboard_data():
+def get_dashboard_data(request: Request):
+    """Aggregate dashboard data, cached briefly and revalidated via ETag"""
+    body, etag = response_cache.get_or_build(
+        DASHBOARD_CACHE_NAMESPACE,
+        lambda: build_dashboard_data().model_dump_json(),
+        settings.dashboard_cache_ttl
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if response_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        response_cache.record(DASHBOARD_CACHE_NAMESPACE, "not_modified")
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def to_stats_response(stats: Optional[DashboardStats]) -> DashboardStatsResponse:
+    """Stats are maintained as diagnoses start and finish; none yet means zeros"""
+    if stats is None:
+        return DashboardStatsResponse(active_tasks=0, success_rate=0.0, avg_resolution_time="", total_cases=0)
+    return DashboardStatsResponse(
+        active_tasks=stats.active_tasks or 0,
+        success_rate=stats.success_rate or 0.0,
+        avg_resolution_time=stats.avg_resolution_time or "",
+        total_cases=stats.total_cases or 0,
+    )
+
+
+@unit_of_work(read_only=True)
+def build_dashboard_data() -> DashboardDataResponse:
     logger.debug("获取仪表盘数据")
     stats = stats_repo.get_stats()
-    if not stats:
-        stats = stats_repo.create_or_update(
-            active_tasks=12,
-            success_rate=94.2,
-            avg_resolution_time="18min",
-            total_cases=1247,
-        )
     cases = case_repo.get_recent_cases(limit=10)
     agents = agent_repo.get_active_agents()
     health_records = health_repo.get_all_health_records()
     logger.debug(f"仪表盘数据: cases={len(cases)}, agents={len(agents)}, health={len(health_records)}")
 
-    stats_response = DashboardStatsResponse(
-        active_tasks=stats.active_tasks,
-        success_rate=stats.success_rate,
-        avg_resolution_time=stats.avg_resolution_time or "",
-        total_cases=stats.total_cases,
-    )
+    stats_response = to_stats_response(stats)
 
     cases_response = [
         CaseResponse(
@@ -86,25 +109,35 @@ def get_dashboard_data():
 
 
 @router.get("/dashboard/stats", response_model=DashboardStatsResponse)
+@unit_of_work(read_only=True)
 def get_dashboard_stats():
     stats = stats_repo.get_stats()
-    if not stats:
-        stats = stats_repo.create_or_update(
-            active_tasks=12,
-            success_rate=94.2,
-            avg_resolution_time="18min",
-            total_cases=1247,
-        )
+    return to_stats_response(stats)
 
-    return DashboardStatsResponse(
-        active_tasks=stats.active_tasks,
-        success_rate=stats.success_rate,
-        avg_resolution_time=stats.avg_resolution_time or "",
-        total_cases=stats.total_cases,
-    )
+
+@router.get("/dashboard/trends", response_model=List[DashboardTrendBucketResponse])
+@unit_of_work(read_only=True)
+def get_dashboard_trends(granularity: str = "hour", limit: int = 24):
+    """Hourly or daily diagnosis rollups, oldest first"""
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(ROLLUP_GRANULARITIES)}")
+    rollups = stats_repo.get_rollups(granularity=granularity, limit=min(max(limit, 1), 500))
+    return [
+        DashboardTrendBucketResponse(
+            bucket_start=rollup.bucket_start.strftime("%Y-%m-%d %H:%M"),
+            started=rollup.started,
+            completed=rollup.completed,
+            failed=rollup.failed,
+            cancelled=rollup.cancelled,
+            avg_resolution_time=format_duration(rollup.total_resolution_seconds / rollup.completed)
+            if rollup.completed else "",
+        )
+        for rollup in reversed(rollups)
+    ]
 
 
 @router.get("/dashboard/cases", response_model=List[CaseResponse])
+@unit_of_work(read_only=True)
 def get_recent_cases(skip: int = 0, limit: int = 10):
     cases = case_repo.get_recent_cases(skip=skip, limit=limit)
     return [
@@ -121,6 +154,7 @@ def get_recent_cases(skip: int = 0, limit: int = 10):
 
 
 @router.get("/dashboard/agents", response_model=List[AgentResponse])
+@unit_of_work(read_only=True)
 def get_agents():
     agents = agent_repo.get_active_agents()
     return [
@@ -136,6 +170,7 @@ def get_agents():
 
 
 @router.get("/system-health")
+@unit_of_work()
 def get_system_health():
     health_records = health_repo.get_all_health_records()
     if not health_records:
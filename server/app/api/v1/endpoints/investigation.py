@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List
 from app.core.logging_config import get_logger
+from app.core.database import unit_of_work
 from app.models.case import Agent
 from app.schemas.case import (
     InvestigationDataResponse,
@@ -13,7 +14,7 @@ from app.schemas.case import (
     DiagnosisActionResponse,
 )
 from app.repositories.agent_repository import AgentRepository
-from app.tasks.diagnosis_tasks import run_diagnosis
+from app.tasks.diagnosis_tasks import submit_diagnosis
 from app.core.session_manager import session_manager
 import uuid
 
@@ -70,6 +71,7 @@ HYPOTHESIS_TREE = {
 
 
 @router.get("", response_model=InvestigationDataResponse)
+@unit_of_work()
 def get_investigation_data():
     agents = agent_repo.get_active_agents()
 
@@ -146,7 +148,7 @@ def start_diagnosis(request: StartDiagnosisRequest):
 
     try:
         # Submit Celery task
-        task = run_diagnosis.delay(session_id, request.problem_description, mode)
+        task = submit_diagnosis(session_id, request.problem_description, mode)
 
         return {
             "session_id": session_id,
@@ -166,8 +168,7 @@ def stop_diagnosis(session_id: str):
 
     if success:
         return {"status": "stopped", "session_id": session_id, "message": "Diagnosis stopped"}
-    else:
-        raise HTTPException(status_code=404, detail="Session not found")
+    return {"status": "not_running", "session_id": session_id, "message": "No diagnosis is running for this session"}
 
 
 @router.get("/task/{task_id}")
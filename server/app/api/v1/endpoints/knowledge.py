@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List
 from app.core.logging_config import get_logger
+from app.core.database import unit_of_work
 from app.models.case import KnowledgeNode, KnowledgeEdge, HistoricalCase
 from app.schemas.case import (
     KnowledgeDataResponse,
@@ -72,6 +73,7 @@ DEFAULT_CASES = [
 
 
 @router.get("", response_model=KnowledgeDataResponse)
+@unit_of_work()
 def get_knowledge_data():
     nodes = knowledge_repo.get_all_nodes()
     edges = knowledge_repo.get_all_edges()
@@ -149,6 +151,7 @@ def get_knowledge_data():
 
 
 @router.get("/graph", response_model=KnowledgeGraphResponse)
+@unit_of_work()
 def get_knowledge_graph():
     nodes = knowledge_repo.get_all_nodes()
     edges = knowledge_repo.get_all_edges()
@@ -196,6 +199,7 @@ def get_knowledge_graph():
 
 
 @router.get("/cases", response_model=List[HistoricalCaseResponse])
+@unit_of_work()
 def get_historical_cases():
     cases = knowledge_repo.get_all_historical_cases()
 
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from typing import List
 import json
 from app.core.logging_config import get_logger
+from app.core.database import unit_of_work
 from app.models.case import Setting
 from app.schemas.case import (
     ToolResponse,
@@ -12,6 +13,7 @@ from app.schemas.case import (
     ModelListResponse,
 )
 from app.repositories.setting_repository import SettingRepository
+from app.core.llm_factory import llm_factory
 from app.middleware.permissions import admin_required
 from app.schemas.user import UserResponse
 
@@ -28,6 +30,7 @@ DEFAULT_TOOLS = [
 
 
 @router.get("/tools", response_model=List[ToolResponse])
+@unit_of_work()
 def get_tools():
     """Get external tool configurations"""
     tools = setting_repo.get_by_type("tool")
@@ -80,6 +83,7 @@ def get_llm_providers(user: UserResponse = Depends(admin_required)):
             api_key=config.get("api_key", ""),
             base_url=config.get("base_url"),
             models=config.get("models", []),
+            max_connections=config.get("max_connections"),
             is_default=getattr(provider, 'is_default', False),
             enabled=provider.enabled
         ))
@@ -106,6 +110,7 @@ def create_llm_provider(data: LLMProviderRequest, user: UserResponse = Depends(a
         "api_key": data.api_key,
         "base_url": data.base_url,
         "models": data.models or [],
+        "max_connections": data.max_connections,
     }
 
     setting_repo.create(**{
@@ -120,6 +125,7 @@ def create_llm_provider(data: LLMProviderRequest, user: UserResponse = Depends(a
     # Set as default if requested
     if data.is_default:
         setting_repo.set_default_provider(setting_id)
+    llm_factory.invalidate_provider_cache()
 
     created = setting_repo.get_by_type_and_id("llm_provider", setting_id)
     config = json.loads(created.config)
@@ -131,6 +137,7 @@ def create_llm_provider(data: LLMProviderRequest, user: UserResponse = Depends(a
         api_key=config["api_key"],
         base_url=config.get("base_url"),
         models=config.get("models", []),
+        max_connections=config.get("max_connections"),
         is_default=getattr(created, 'is_default', False),
         enabled=created.enabled
     )
@@ -154,6 +161,8 @@ def update_llm_provider(provider_id: str, data: LLMProviderUpdateRequest, user:
         config["base_url"] = data.base_url
     if data.models is not None:
         config["models"] = data.models
+    if data.max_connections is not None:
+        config["max_connections"] = data.max_connections
     if data.enabled is not None:
         provider.enabled = data.enabled
 
@@ -164,6 +173,7 @@ def update_llm_provider(provider_id: str, data: LLMProviderUpdateRequest, user:
     # Save updates
     setting_repo.update(provider.id, name=provider.name, enabled=provider.enabled)
     setting_repo.update_config("llm_provider", provider_id, json.dumps(config))
+    llm_factory.invalidate_provider_cache()
 
     updated = setting_repo.get_by_type_and_id("llm_provider", provider_id)
     config = json.loads(updated.config)
@@ -175,6 +185,7 @@ def update_llm_provider(provider_id: str, data: LLMProviderUpdateRequest, user:
         api_key=config["api_key"],
         base_url=config.get("base_url"),
         models=config.get("models", []),
+        max_connections=config.get("max_connections"),
         is_default=getattr(updated, 'is_default', False),
         enabled=updated.enabled
     )
@@ -191,6 +202,7 @@ def delete_llm_provider(provider_id: str, user: UserResponse = Depends(admin_req
         raise HTTPException(status_code=400, detail="Cannot delete default provider. Set another provider as default first.")
 
     setting_repo.delete(provider.id)
+    llm_factory.invalidate_provider_cache()
     return {"status": "deleted"}
 
 
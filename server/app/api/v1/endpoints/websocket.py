@@ -1,13 +1,17 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional, Set
 import json
 import asyncio
 from datetime import datetime
 import uuid
 from app.core.logging_config import get_logger
 from app.core.session_manager import session_manager
-from app.core.event_subscriber import EventSubscriber
-from app.tasks.diagnosis_tasks import run_diagnosis
+from app.core.config import settings
+from app.core.send_queue import SendQueue
+from app.core.workflow_control import workflow_control
+from app.core.event_subscriber import event_dispatcher, replay_diagnosis_events, stream_id_key
+from app.tasks.diagnosis_tasks import submit_diagnosis
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -16,58 +20,180 @@ router = APIRouter()
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
-        self.subscribers: Dict[str, EventSubscriber] = {}
+        self.send_queues: Dict[str, SendQueue] = {}
+        self.writers: Dict[str, asyncio.Task] = {}
+        self.subscribed_sessions: Set[str] = set()
+        self.last_event_ids: Dict[str, str] = {}
+        # Counters accumulated from closed connections
+        self.total_sent = 0
+        self.total_dropped = 0
+        self.total_coalesced = 0
+        self.slow_disconnects = 0
 
     async def connect(self, websocket: WebSocket, session_id: str):
         await websocket.accept()
+        previous = self.active_connections.get(session_id)
+        if previous is not None:
+            # Same session reconnecting: retire the previous socket first
+            self.disconnect(session_id)
+            asyncio.create_task(self._close(previous))
         self.active_connections[session_id] = websocket
+        queue = SendQueue(settings.ws_send_queue_size)
+        self.send_queues[session_id] = queue
+        self.writers[session_id] = asyncio.create_task(self._writer(session_id, websocket, queue))
         logger.info(f"WebSocket connected: {session_id}, total: {len(self.active_connections)}")
 
-    def disconnect(self, session_id: str):
+    def disconnect(self, session_id: str, websocket: Optional[WebSocket] = None):
+        if websocket is not None and self.active_connections.get(session_id) is not websocket:
+            # A newer connection owns this session now
+            return
         if session_id in self.active_connections:
             del self.active_connections[session_id]
-        if session_id in self.subscribers:
-            self.subscribers[session_id].stop()
-            del self.subscribers[session_id]
+        queue = self.send_queues.pop(session_id, None)
+        if queue is not None:
+            self.total_sent += queue.sent
+            self.total_dropped += queue.dropped
+            self.total_coalesced += queue.coalesced
+        writer = self.writers.pop(session_id, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+        if session_id in self.subscribed_sessions:
+            event_dispatcher.unregister(session_id)
+            self.subscribed_sessions.discard(session_id)
+        self.last_event_ids.pop(session_id, None)
         logger.info(f"WebSocket disconnected: {session_id}, total: {len(self.active_connections)}")
 
     async def send_message(self, session_id: str, message: dict):
-        if session_id in self.active_connections:
-            websocket = self.active_connections[session_id]
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                logger.error(f"Send failed {session_id}: {e}")
-                self.disconnect(session_id)
-
-    async def subscribe_to_events(self, session_id: str):
-        """Subscribe to Redis Pub/Sub events for this session"""
-        if session_id in self.subscribers:
+        """Queue a message for the session's writer task without waiting on the socket"""
+        queue = self.send_queues.get(session_id)
+        if queue is None:
             return
+        if not queue.put(message):
+            # Dropping it would leave the client inconsistent: make it reconnect and catch up
+            logger.warning(f"Disconnecting slow client {session_id}: queue full, "
+                           f"no room for {message.get('type')}, dropped={queue.dropped}")
+            self.slow_disconnects += 1
+            websocket = self.active_connections.get(session_id)
+            self.disconnect(session_id)
+            if websocket is not None:
+                asyncio.create_task(self._close(websocket))
+
+    async def _writer(self, session_id: str, websocket: WebSocket, queue: SendQueue):
+        """Drain the session queue onto the socket; a stuck or failed send ends the connection"""
+        try:
+            while True:
+                message = await queue.get()
+                await asyncio.wait_for(websocket.send_json(message), timeout=settings.ws_slow_client_timeout)
+                queue.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Send failed {session_id}: {e!r}")
+            self.disconnect(session_id, websocket)
+            await self._close(websocket)
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        """Outbound queue gauges and counters for monitoring"""
+        queues = list(self.send_queues.values())
+        return {
+            "connections": len(self.active_connections),
+            "queued_messages": sum(len(q) for q in queues),
+            "max_queue_depth": max((len(q) for q in queues), default=0),
+            "lagging_clients": sum(1 for q in queues if q.full_since is not None),
+            "sent_total": self.total_sent + sum(q.sent for q in queues),
+            "dropped_total": self.total_dropped + sum(q.dropped for q in queues),
+            "coalesced_total": self.total_coalesced + sum(q.coalesced for q in queues),
+            "slow_disconnects_total": self.slow_disconnects,
+        }
+
+    async def send_event(self, session_id: str, event: dict):
+        """Forward a diagnosis event, skipping stream entries already delivered"""
+        event_id = event.get("event_id")
+        if event_id:
+            last_id = self.last_event_ids.get(session_id)
+            if last_id and stream_id_key(event_id) <= stream_id_key(last_id):
+                return
+            self.last_event_ids[session_id] = event_id
+        await self.send_message(session_id, event)
+
+    async def subscribe_to_events(self, session_id: str, last_event_id: Optional[str] = None):
+        """Route Redis Pub/Sub events for this session to its WebSocket.
+
+        All sessions share the process-wide event_dispatcher connection;
+        disconnect() removes the route. With the streams transport and a
+        last_event_id, events missed since that id are replayed first and
+        live events arriving meanwhile are held back until replay is done.
+        """
+        if session_id in self.subscribed_sessions:
+            return
+
+        replay = last_event_id is not None and settings.event_transport == "streams"
+        held_back: Optional[List[Dict]] = [] if replay else None
 
         async def event_handler(event: Dict):
-            await self.send_message(session_id, event)
+            if held_back is not None:
+                held_back.append(event)
+                return
+            await self.send_event(session_id, event)
+
+        self.subscribed_sessions.add(session_id)
+        try:
+            await event_dispatcher.register(session_id, event_handler)
+        except Exception:
+            self.subscribed_sessions.discard(session_id)
+            raise
+        if session_id not in self.active_connections:
+            # Client went away while the dispatcher was subscribing
+            event_dispatcher.unregister(session_id)
+            self.subscribed_sessions.discard(session_id)
+            return
 
-        subscriber = EventSubscriber()
-        await subscriber.subscribe_to_diagnosis(session_id, event_handler)
-        self.subscribers[session_id] = subscriber
+        if replay:
+            if last_event_id:
+                self.last_event_ids[session_id] = last_event_id
+            try:
+                for event in await replay_diagnosis_events(session_id, last_event_id):
+                    await self.send_event(session_id, event)
+            finally:
+                while held_back:
+                    await self.send_event(session_id, held_back.pop(0))
+                held_back = None
 
 
 manager = ConnectionManager()
 
 
 @router.websocket("/agent/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    session_id = str(uuid.uuid4())
+async def websocket_endpoint(
+    websocket: WebSocket,
+    session_id: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+):
+    resumed = session_id is not None
+    session_id = session_id or str(uuid.uuid4())
     await manager.connect(websocket, session_id)
 
     # Send session_id to client
     await manager.send_message(session_id, {
         "type": "connection_established",
-        "data": {"session_id": session_id},
+        "data": {"session_id": session_id, "resumed": resumed},
         "timestamp": datetime.now().isoformat()
     })
 
+    if resumed:
+        # Reconnecting client: catch up from its last event instead of a full reload
+        try:
+            await manager.subscribe_to_events(session_id, last_event_id)
+        except Exception as e:
+            logger.error(f"Failed to resume events [{session_id}]: {e}")
+            await send_error(session_id, f"Failed to resume events: {str(e)}")
+
     # Start heartbeat
     heartbeat_task = asyncio.create_task(heartbeat(session_id))
 
@@ -84,7 +210,7 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.error(f"WebSocket error [{session_id}]: {e}", exc_info=True)
     finally:
         heartbeat_task.cancel()
-        manager.disconnect(session_id)
+        manager.disconnect(session_id, websocket)
 
 
 async def heartbeat(session_id: str):
@@ -115,6 +241,8 @@ async def handle_message(session_id: str, message: dict):
         await approve_action(session_id, data)
     elif message_type == "reject_action":
         await reject_action(session_id, data)
+    elif message_type == "confirmation_response":
+        await confirmation_response(session_id, data)
     elif message_type == "pause_diagnosis":
         await pause_diagnosis(session_id, data)
     elif message_type == "resume_diagnosis":
@@ -146,13 +274,13 @@ async def start_diagnosis(session_id: str, data: dict):
 
     try:
         # Create session
-        session_manager.create_session(session_id, user_id)
+        await run_in_threadpool(session_manager.create_session, session_id, user_id)
 
         # Subscribe to events
         await manager.subscribe_to_events(session_id)
 
-        # Submit Celery task
-        task = run_diagnosis.delay(session_id, symptom, mode)
+        # Submit Celery task (Redis and broker round trips: keep them off the loop)
+        task = await run_in_threadpool(submit_diagnosis, session_id, symptom, mode)
 
         await send_message(session_id, "diagnosis_started", {
             "session_id": session_id,
@@ -167,15 +295,17 @@ async def start_diagnosis(session_id: str, data: dict):
 
 async def stop_diagnosis(session_id: str, data: dict):
     from app.services.workflow_engine import workflow_engine
-    workflow_engine.cancel_workflow(session_id)
+    running = await run_in_threadpool(workflow_engine.cancel_workflow, session_id)
     await send_message(session_id, "diagnosis_status", {
         "status": "stopped",
-        "session_id": session_id
+        "session_id": session_id,
+        "was_running": running
     })
 
 
 async def approve_action(session_id: str, data: dict):
     action_id = data.get("actionId", "")
+    await run_in_threadpool(workflow_control.send_confirmation, session_id, action_id, {**data, "action": "approve"})
     await send_message(session_id, "action_approved", {
         "action_id": action_id,
         "session_id": session_id
@@ -185,6 +315,7 @@ async def approve_action(session_id: str, data: dict):
 async def reject_action(session_id: str, data: dict):
     action_id = data.get("actionId", "")
     reason = data.get("reason", "")
+    await run_in_threadpool(workflow_control.send_confirmation, session_id, action_id, {**data, "action": "reject"})
     await send_message(session_id, "action_rejected", {
         "action_id": action_id,
         "reason": reason,
@@ -192,9 +323,20 @@ async def reject_action(session_id: str, data: dict):
     })
 
 
+async def confirmation_response(session_id: str, data: dict):
+    confirmation_id = data.get("confirmationId", "")
+    response = data.get("response") or {}
+    await run_in_threadpool(workflow_control.send_confirmation, session_id, confirmation_id, response)
+    await send_message(session_id, "confirmation_received", {
+        "confirmation_id": confirmation_id,
+        "action": response.get("action"),
+        "session_id": session_id
+    })
+
+
 async def pause_diagnosis(session_id: str, data: dict):
     from app.services.workflow_engine import workflow_engine
-    workflow_engine.pause_workflow(session_id)
+    await run_in_threadpool(workflow_engine.pause_workflow, session_id)
     await send_message(session_id, "diagnosis_status", {
         "status": "paused",
         "session_id": session_id
@@ -203,7 +345,7 @@ async def pause_diagnosis(session_id: str, data: dict):
 
 async def resume_diagnosis(session_id: str, data: dict):
     from app.services.workflow_engine import workflow_engine
-    workflow_engine.resume_workflow(session_id)
+    await run_in_threadpool(workflow_engine.resume_workflow, session_id)
     await send_message(session_id, "diagnosis_status", {
         "status": "resumed",
         "session_id": session_id
@@ -0,0 +1,101 @@
+from typing import Any, Awaitable, Optional
+import asyncio
+import concurrent.futures
+import os
+import threading
+from app.core.config import settings
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncLoopRunner:
+    """Runs coroutines on one long-lived event loop per worker process.
+
+    Celery task threads submit coroutines with run() and block on the
+    result, while the loop interleaves every in-flight diagnosis up to
+    max_concurrency. HTTP and LLM clients created on the loop stay warm
+    across tasks instead of being torn down by asyncio.run().
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._ensure_loop()
+
+    def _is_running(self) -> bool:
+        return (
+            self._loop is not None
+            and self._pid == os.getpid()
+            and self._thread is not None
+            and self._thread.is_alive()
+        )
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        # Started lazily so each forked worker process gets its own loop thread
+        if self._is_running():
+            return self._loop
+        with self._lock:
+            if self._is_running():
+                return self._loop
+
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                ready.set()
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name="diagnosis-event-loop", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            self._pid = os.getpid()
+            self._semaphore = None
+            logger.info(f"Started persistent event loop (pid={self._pid}, max_concurrency={self.max_concurrency})")
+            return loop
+
+    async def _limited(self, coro: Awaitable[Any]) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await coro
+
+    def submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop under the concurrency limit"""
+        return asyncio.run_coroutine_threadsafe(self._limited(coro), self._ensure_loop())
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the shared loop and block the calling thread for its result"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+        except BaseException:
+            # e.g. Celery's SoftTimeLimitExceeded raised in the waiting thread
+            future.cancel()
+            raise
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the loop thread for this process"""
+        if not self._is_running():
+            return
+        loop, thread = self._loop, self._thread
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        self._loop = None
+        self._thread = None
+        logger.info("Stopped persistent event loop")
+
+
+async_runner = AsyncLoopRunner(settings.diagnosis_max_concurrency)
@@ -0,0 +1,49 @@
+from typing import Optional, Tuple
+import threading
+import time
+
+
+class FlushBackoff:
+    """Retry delay and error-log throttling for a background flusher.
+
+    While flushes keep failing, delay doubles from base_delay up to
+    max_delay, and failure() allows one error log per log_interval seconds
+    (reporting how many failures were suppressed meanwhile). success()
+    resets both.
+    """
+
+    def __init__(self, base_delay: float, max_delay: float = 30.0, log_interval: float = 60.0):
+        self.base_delay = base_delay
+        self.max_delay = max(max_delay, base_delay)
+        self.log_interval = log_interval
+        self.failures = 0
+        self._suppressed = 0
+        self._last_logged: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def delay(self) -> float:
+        """Seconds to wait before the next flush attempt"""
+        if not self.failures:
+            return self.base_delay
+        return min(self.base_delay * 2 ** min(self.failures, 16), self.max_delay)
+
+    def failure(self) -> Tuple[bool, int]:
+        """Record a failed flush; returns (whether to log it, failures suppressed since the last log)"""
+        with self._lock:
+            self.failures += 1
+            now = time.monotonic()
+            if self._last_logged is None or now - self._last_logged >= self.log_interval:
+                suppressed, self._suppressed = self._suppressed, 0
+                self._last_logged = now
+                return True, suppressed
+            self._suppressed += 1
+            return False, 0
+
+    def success(self) -> int:
+        """Record a successful flush; returns how many consecutive failures it ends"""
+        with self._lock:
+            failures, self.failures = self.failures, 0
+            self._suppressed = 0
+            self._last_logged = None
+            return failures
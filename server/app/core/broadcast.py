@@ -0,0 +1,108 @@
+from typing import Callable, Dict, List, Optional
+import json
+import os
+import threading
+import time
+import uuid
+from app.core.redis_client import redis_client
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+CONFIG_BROADCAST_CHANNEL = "config:invalidate"
+
+InvalidationHandler = Callable[[], None]
+
+
+class ConfigBroadcast:
+    """Cross-process invalidation of in-process configuration caches.
+
+    invalidate(topic) runs the local handlers for topic right away and
+    publishes it on Redis; every other API and worker process runs its own
+    handlers from a daemon listener thread. After a dropped connection all
+    handlers run once, since invalidations may have been missed meanwhile.
+    """
+
+    def __init__(self, channel: str = CONFIG_BROADCAST_CHANNEL, reconnect_delay: float = 1.0):
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.redis = redis_client.get_client()
+        self._handlers: Dict[str, List[InvalidationHandler]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._listener_pid: Optional[int] = None
+        self._origin: Optional[str] = None
+
+    def subscribe(self, topic: str, handler: InvalidationHandler) -> None:
+        """Run handler whenever topic is invalidated in any process"""
+        with self._lock:
+            self._handlers.setdefault(topic, []).append(handler)
+
+    def invalidate(self, topic: str) -> None:
+        """Invalidate topic locally and in every other subscribed process"""
+        self._run_handlers(topic)
+        try:
+            self.redis.publish(self.channel, json.dumps({"topic": topic, "origin": self._process_origin()}))
+        except Exception as e:
+            logger.error(f"Failed to broadcast invalidation of {topic}: {e}")
+
+    def ensure_listening(self) -> None:
+        # Celery forks workers after import, so the thread is started lazily per process
+        if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._listener = threading.Thread(target=self._run_listener, name="config-broadcast", daemon=True)
+            self._listener.start()
+
+    def _process_origin(self) -> str:
+        if self._origin is None or not self._origin.startswith(f"{os.getpid()}:"):
+            self._origin = f"{os.getpid()}:{uuid.uuid4().hex}"
+        return self._origin
+
+    def _run_handlers(self, topic: str) -> None:
+        with self._lock:
+            handlers = list(self._handlers.get(topic, []))
+        for handler in handlers:
+            try:
+                handler()
+            except Exception as e:
+                logger.error(f"Invalidation handler for {topic} failed: {e}")
+
+    def _run_listener(self) -> None:
+        connected_before = False
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                if connected_before:
+                    with self._lock:
+                        topics = list(self._handlers)
+                    for topic in topics:
+                        self._run_handlers(topic)
+                connected_before = True
+                logger.info(f"Config broadcast listening on: {self.channel}")
+                for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    try:
+                        payload = json.loads(message['data'])
+                    except json.JSONDecodeError as e:
+                        logger.error(f"Failed to decode invalidation message: {e}")
+                        continue
+                    if payload.get("origin") == self._process_origin():
+                        continue
+                    self._run_handlers(payload.get("topic", ""))
+            except Exception as e:
+                logger.error(f"Config broadcast connection error, reconnecting: {e}")
+                time.sleep(self.reconnect_delay)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+config_broadcast = ConfigBroadcast()
@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_process_init
 from app.core.config import settings
 from app.core.logging_config import get_logger
 
@@ -22,6 +23,24 @@ celery_app.conf.update(
     task_soft_time_limit=settings.celery_task_timeout - 60,
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    worker_pool=settings.celery_worker_pool,
+    # Redeliver tasks from a crashed worker; checkpointed workflows resume
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
 )
 
+if settings.celery_worker_concurrency:
+    celery_app.conf.worker_concurrency = settings.celery_worker_concurrency
+elif settings.celery_worker_pool == "threads":
+    # One task thread per diagnosis slot on the persistent loop
+    celery_app.conf.worker_concurrency = settings.diagnosis_max_concurrency
+
+
+@worker_process_init.connect
+def reset_db_pool(**kwargs):
+    """Forked worker children must not reuse the parent's pooled connections"""
+    from app.core.database import engine
+    engine.dispose(close=False)
+
+
 logger.info("Celery app initialized")
@@ -1,20 +1,156 @@
-from sqlalchemy import create_engine
+from typing import Any, Dict, Optional
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from contextlib import contextmanager
+from sqlalchemy.pool import NullPool, QueuePool
+from contextlib import asynccontextmanager, contextmanager
 from sqlalchemy.orm import sessionmaker, Session
 from app.core.config import settings
+from contextvars import ContextVar
 from functools import wraps
+import asyncio
 import inspect
 import datetime
+import threading
+import time
+
+# Connections per process: the API serves many concurrent requests, each
+# Celery worker child runs one diagnosis at a time, scripts need just one.
+# DB_POOL_SIZE / DB_MAX_OVERFLOW override the selected profile.
+# Per-process connection budget, split between the sync engine and the
+# async one (created only where async repository methods are used, i.e. the API)
+DB_POOL_PROFILES = {
+    "api": {"pool_size": 8, "max_overflow": 16, "async_pool_size": 2, "async_max_overflow": 4},
+    "worker": {"pool_size": 4, "max_overflow": 4, "async_pool_size": 1, "async_max_overflow": 0},
+    "script": {"pool_size": 1, "max_overflow": 0, "async_pool_size": 1, "async_max_overflow": 0},
+}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.timeouts += timed_out
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+    def wait_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+def pool_options(async_engine: bool = False) -> Dict[str, Any]:
+    """create_engine pool arguments for the configured profile; DB_POOL_SIZE/DB_MAX_OVERFLOW size the sync engine"""
+    if "sqlite" in settings.database_url:
+        return {}
+    if settings.db_pgbouncer:
+        # PgBouncer (transaction pooling) owns the pooling; hold nothing locally
+        return {"poolclass": NullPool}
+    profile = DB_POOL_PROFILES.get(settings.db_pool_profile, DB_POOL_PROFILES["api"])
+    if async_engine:
+        return {
+            "pool_size": profile["async_pool_size"],
+            "max_overflow": profile["async_max_overflow"],
+            "pool_timeout": settings.db_pool_timeout,
+            "pool_recycle": settings.db_pool_recycle,
+            "pool_pre_ping": settings.db_pool_pre_ping,
+        }
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size if settings.db_pool_size is not None else profile["pool_size"],
+        "max_overflow": settings.db_max_overflow if settings.db_max_overflow is not None else profile["max_overflow"],
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
 
 engine = create_engine(
     settings.database_url,
     connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
-    echo=False
+    echo=False,
+    **pool_options()
 )
 
+
+def pool_stats() -> Dict[str, Any]:
+    """Pool occupancy and checkout wait statistics of this process"""
+    pool = engine.pool
+    stats: Dict[str, Any] = {
+        "profile": settings.db_pool_profile,
+        "pgbouncer": settings.db_pgbouncer,
+        "pool_class": type(pool).__name__,
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(pool.wait_stats())
+    return stats
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+class AsyncBackedSession(Session):
+    """Sync session class behind AsyncSessions, so they share the write counting below"""
+
+# Session of the unit_of_work() active in the current context, if any
+_unit_session: ContextVar[Optional[Session]] = ContextVar("unit_of_work_session", default=None)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+@event.listens_for(AsyncBackedSession, "after_flush")
+def _count_flush(session, flush_context):
+    session.info["writes"] = session.info.get("writes", 0) + 1
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+@event.listens_for(AsyncBackedSession, "do_orm_execute")
+def _count_dml(orm_execute_state):
+    if not orm_execute_state.is_select:
+        session = orm_execute_state.session
+        session.info["writes"] = session.info.get("writes", 0) + 1
+
+
+def _after_write(repositories) -> None:
+    """Run the write hooks of repositories whose changes were just committed"""
+    for repository in dict.fromkeys(repositories):
+        hook = getattr(repository, "_after_write", None)
+        if hook is not None:
+            hook()
+
+
 Base = declarative_base()
 
 
@@ -32,9 +168,55 @@ def session_scope() -> Session:
         session.close()
 
 
+@contextmanager
+def unit_of_work(read_only: bool = False) -> Session:
+    """Run every repository call in the block on one session and transaction.
+
+    with_session methods called inside pick this session up instead of
+    opening, committing and closing their own. The transaction is committed
+    once on exit if anything was written; otherwise, and always when
+    read_only (a READ ONLY transaction on PostgreSQL), it is just closed.
+    Nested blocks join the outermost one. Also usable as a decorator on
+    sync endpoints, which FastAPI runs in a worker thread.
+    """
+    current = _unit_session.get()
+    if current is not None:
+        yield current
+        return
+
+    session = SessionLocal()
+    token = _unit_session.set(session)
+    try:
+        if read_only and engine.dialect.name == "postgresql":
+            session.connection().execute(text("SET TRANSACTION READ ONLY"))
+        yield session
+        if session.info.get("writes") and not read_only:
+            session.commit()
+            _after_write(session.info.get("written_by", []))
+        else:
+            session.rollback()
+    except:
+        session.rollback()
+        raise
+    finally:
+        _unit_session.reset(token)
+        session.close()
+
+
 def with_session(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
+        unit = _unit_session.get()
+        if unit is not None:
+            # Inside unit_of_work(): its owner commits once at the end
+            writes = unit.info.get("writes", 0)
+            if args and hasattr(args[0], '__class__'):
+                result = f(args[0], unit, *args[1:], **kwargs)
+            else:
+                result = f(unit, *args, **kwargs)
+            if args and unit.info.get("writes", 0) != writes:
+                unit.info.setdefault("written_by", []).append(args[0])
+            return result
         with session_scope() as session:
             try:
                 if args and hasattr(args[0], '__class__'):
@@ -42,10 +224,12 @@ def with_session(f):
                 else:
                     result = f(session, *args, **kwargs)
                 session.commit()
-                return result
             except:
                 session.rollback()
                 raise
+        if args and session.info.get("writes"):
+            _after_write([args[0]])
+        return result
     return wrapper
 
 def get_db():
@@ -53,4 +237,63 @@ def get_db():
     try:
         yield session
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+
+# Async engine for code running on the event loop (API endpoints, WebSocket
+# handlers). Created on first use so Celery workers and scripts, which stay
+# on the sync engine, never need the asyncpg driver.
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+_async_engine: Optional[AsyncEngine] = None
+_async_sessionmaker: Optional[async_sessionmaker] = None
+
+
+def async_database_url() -> URL:
+    # Keep the URL object: str(URL) masks the password as ***
+    url = make_url(settings.database_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        options = pool_options(async_engine=True)
+        options.pop("poolclass", None)
+        connect_args = {}
+        if settings.db_pgbouncer and "sqlite" not in settings.database_url:
+            # Transaction pooling can't keep prepared statements across transactions
+            options["poolclass"] = NullPool
+            connect_args = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        _async_engine = create_async_engine(async_database_url(), echo=False, connect_args=connect_args, **options)
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False,
+                                                 sync_session_class=AsyncBackedSession)
+    return _async_engine
+
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncSession:
+    """session_scope for coroutines"""
+    get_async_engine()
+    session = _async_sessionmaker()
+    try:
+        yield session
+        await session.commit()
+    except:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+def with_async_session(f):
+    """with_session for async repository methods: injects an AsyncSession after self"""
+    @wraps(f)
+    async def wrapper(self, *args, **kwargs):
+        async with async_session_scope() as session:
+            result = await f(self, session, *args, **kwargs)
+        if session.info.get("writes"):
+            # Committed: run the write hooks (sync Redis calls) off the loop
+            await asyncio.get_running_loop().run_in_executor(None, _after_write, [self])
+        return result
+    return wrapper
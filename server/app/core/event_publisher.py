@@ -1,13 +1,42 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import json
+import os
+import threading
+import time
+from app.core.backoff import FlushBackoff
 from app.core.redis_client import redis_client
+from app.core.config import settings
 from app.core.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+DIAGNOSIS_STREAM_PREFIX = "diagnosis_stream:"
+
+# XADD to the capped session stream and PUBLISH the same payload with the
+# stream entry id spliced in as "event_id", in one round trip.
+STREAM_PUBLISH_SCRIPT = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'event', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+local payload = ARGV[2]
+if payload == '{}' then
+    payload = '{"event_id": "' .. id .. '"}'
+else
+    payload = '{"event_id": "' .. id .. '", ' .. string.sub(payload, 2)
+end
+redis.call('PUBLISH', ARGV[4], payload)
+return id
+"""
+
+
+def diagnosis_stream_key(session_id: str) -> str:
+    return f"{DIAGNOSIS_STREAM_PREFIX}{session_id}"
+
+
 class EventPublisher:
     def __init__(self):
         self.redis = redis_client.get_client()
+        self.use_streams = settings.event_transport == "streams"
+        self._stream_publish = self.redis.register_script(STREAM_PUBLISH_SCRIPT)
 
     def publish(self, channel: str, event: Dict[str, Any]) -> bool:
         """Publish event to Redis Pub/Sub channel"""
@@ -20,9 +49,140 @@ class EventPublisher:
             logger.error(f"Failed to publish event to {channel}: {e}")
             return False
 
+    def _append_args(self, session_id: str, event: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+        payload = {k: v for k, v in event.items() if k != "event_id"}
+        keys = [diagnosis_stream_key(session_id)]
+        args = [settings.event_stream_maxlen, json.dumps(payload), settings.event_stream_ttl, f"diagnosis:{session_id}"]
+        return keys, args
+
+    def append(self, session_id: str, event: Dict[str, Any]) -> Optional[str]:
+        """Append event to the session stream and publish it; returns the stream id"""
+        channel = f"diagnosis:{session_id}"
+        try:
+            keys, args = self._append_args(session_id, event)
+            event_id = self._stream_publish(keys=keys, args=args)
+            logger.debug(f"Appended event to {channel}: {event.get('type', 'unknown')} ({event_id})")
+            return event_id
+        except Exception as e:
+            logger.error(f"Failed to append event to {channel}: {e}")
+            return None
+
     def publish_diagnosis_event(self, session_id: str, event: Dict[str, Any]) -> bool:
         """Publish diagnosis event to session-specific channel"""
+        if self.use_streams:
+            return self.append(session_id, event) is not None
         channel = f"diagnosis:{session_id}"
         return self.publish(channel, event)
 
-event_publisher = EventPublisher()
+    def flush(self) -> int:
+        """Unbuffered publisher: nothing to flush"""
+        return 0
+
+
+class BufferedEventPublisher(EventPublisher):
+    """Buffers diagnosis events and ships them through one Redis pipeline.
+
+    Events are flushed when batch_size is reached, flush_interval after the
+    first buffered event, or on an explicit flush() (workflow node
+    boundaries and terminal task states). Order is preserved per process.
+    A failed batch is put back in front of the buffer for the next flush;
+    beyond max_buffer events the oldest are dropped. While flushes fail,
+    retries back off exponentially and errors are logged at most once a
+    minute.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, flush_interval_ms: Optional[int] = None,
+                 max_buffer: Optional[int] = None):
+        super().__init__()
+        self.batch_size = batch_size or settings.event_publish_batch_size
+        self.flush_interval = (flush_interval_ms or settings.event_publish_flush_interval_ms) / 1000
+        self.max_buffer = max_buffer or settings.event_publish_max_buffer
+        self._backoff = FlushBackoff(self.flush_interval)
+        self.dropped = 0
+        self._buffer: List[Tuple[str, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid: Optional[int] = None
+
+    def publish_diagnosis_event(self, session_id: str, event: Dict[str, Any]) -> bool:
+        """Queue diagnosis event for the next pipelined flush"""
+        if self.batch_size <= 1:
+            return super().publish_diagnosis_event(session_id, event)
+
+        with self._lock:
+            self._buffer.append((session_id, event))
+            if len(self._buffer) > self.max_buffer:
+                del self._buffer[0]
+                self.dropped += 1
+            # While failing, leave retries to the backed-off flusher
+            full = len(self._buffer) >= self.batch_size and not self._backoff.failures
+        if full:
+            self.flush()
+        else:
+            self._ensure_flusher()
+            self._pending.set()
+        return True
+
+    def flush(self) -> int:
+        """Send all buffered events in a single pipeline; returns the count sent"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                self._pending.clear()
+            if not batch:
+                return 0
+
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for session_id, event in batch:
+                    if self.use_streams:
+                        keys, args = self._append_args(session_id, event)
+                        self._stream_publish(keys=keys, args=args, client=pipe)
+                    else:
+                        pipe.publish(f"diagnosis:{session_id}", json.dumps(event))
+                pipe.execute()
+            except Exception as e:
+                log, suppressed = self._backoff.failure()
+                if log:
+                    logger.error(f"Failed to flush {len(batch)} buffered events "
+                                 f"({suppressed} failures not logged, {self.dropped} events dropped so far), "
+                                 f"retrying in {self._backoff.delay:.1f}s: {e}")
+                self._requeue(batch)
+                return 0
+
+            failures = self._backoff.success()
+            if failures:
+                logger.info(f"Buffered events published again after {failures} failed flushes")
+            logger.debug(f"Flushed {len(batch)} buffered events")
+            return len(batch)
+
+    def _requeue(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        with self._lock:
+            self._buffer[:0] = batch
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self.dropped += overflow
+        self._ensure_flusher()
+        self._pending.set()
+
+    def _ensure_flusher(self):
+        # Celery forks workers after import, so the thread is started lazily per process
+        if self._flusher is not None and self._flusher.is_alive() and self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive() and self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._run_flusher, name="event-publisher-flush", daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            self._pending.wait()
+            time.sleep(self._backoff.delay)
+            self.flush()
+
+event_publisher = BufferedEventPublisher()
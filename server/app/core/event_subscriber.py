@@ -1,46 +1,153 @@
-from typing import Callable, Dict, Any, Optional
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Set, Tuple
 import json
 import asyncio
 from app.core.redis_client import redis_client
+from app.core.config import settings
+from app.core.event_publisher import diagnosis_stream_key
 from app.core.logging_config import get_logger
 
 logger = get_logger(__name__)
 
-class EventSubscriber:
-    def __init__(self):
-        self.redis = redis_client.get_client()
-        self.pubsub = None
+EventCallback = Callable[[Dict[str, Any]], Awaitable[None]]
 
-    async def subscribe(self, channel: str, callback: Callable[[Dict[str, Any]], None]) -> None:
-        """Subscribe to Redis Pub/Sub channel and process messages"""
-        self.pubsub = self.redis.pubsub()
-        self.pubsub.subscribe(channel)
-        logger.info(f"Subscribed to channel: {channel}")
+DIAGNOSIS_CHANNEL_PREFIX = "diagnosis:"
+
+
+class EventDispatcher:
+    """Process-wide diagnosis event fan-out over a single pub/sub connection.
+
+    One PSUBSCRIBE on ``diagnosis:*`` replaces a connection per WebSocket
+    session; messages are routed to local handlers by session id, so the
+    Redis connection count stays flat however many sessions are attached.
+    """
+
+    def __init__(self, pattern: str = f"{DIAGNOSIS_CHANNEL_PREFIX}*", reconnect_delay: float = 1.0,
+                 subscribe_timeout: float = 5.0):
+        self.pattern = pattern
+        self.reconnect_delay = reconnect_delay
+        self.subscribe_timeout = subscribe_timeout
+        self._handlers: Dict[str, Set[EventCallback]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._subscribed = asyncio.Event()
+
+    @property
+    def session_count(self) -> int:
+        return len(self._handlers)
+
+    async def register(self, session_id: str, callback: EventCallback) -> None:
+        """Route events for session_id to callback, starting the listener if needed"""
+        self._handlers.setdefault(session_id, set()).add(callback)
+        self._ensure_started()
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout=self.subscribe_timeout)
+        except asyncio.TimeoutError:
+            self.unregister(session_id, callback)
+            raise ConnectionError(f"Event dispatcher not subscribed after {self.subscribe_timeout}s")
+        logger.debug(f"Dispatcher registered session: {session_id}, total: {self.session_count}")
+
+    def unregister(self, session_id: str, callback: Optional[EventCallback] = None) -> None:
+        """Stop routing events for session_id (or only the given callback)"""
+        handlers = self._handlers.get(session_id)
+        if handlers is None:
+            return
+        if callback is not None:
+            handlers.discard(callback)
+        if callback is None or not handlers:
+            del self._handlers[session_id]
+        logger.debug(f"Dispatcher unregistered session: {session_id}, total: {self.session_count}")
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._subscribed.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the listener task and drop all routes"""
+        task, self._task = self._task, None
+        self._handlers.clear()
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        redis = redis_client.get_async_client()
+        while True:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(self.pattern)
+                self._subscribed.set()
+                logger.info(f"Event dispatcher subscribed to pattern: {self.pattern}")
+                async for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        await self._dispatch(message['channel'], message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._subscribed.clear()
+                logger.error(f"Event dispatcher connection error, reconnecting: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+
+    async def _dispatch(self, channel: str, data: str) -> None:
+        session_id = channel[len(DIAGNOSIS_CHANNEL_PREFIX):]
+        handlers = self._handlers.get(session_id)
+        if not handlers:
+            return
 
         try:
-            for message in self.pubsub.listen():
-                if message['type'] == 'message':
-                    try:
-                        event = json.loads(message['data'])
-                        await callback(event)
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Failed to decode message: {e}")
-                    except Exception as e:
-                        logger.error(f"Error processing message: {e}")
-        except Exception as e:
-            logger.error(f"Subscription error: {e}")
-        finally:
-            if self.pubsub:
-                self.pubsub.unsubscribe(channel)
-                self.pubsub.close()
-
-    def unsubscribe(self, channel: Optional[str] = None) -> None:
-        """Unsubscribe from channel(s)"""
-        if self.pubsub:
-            if channel:
-                self.pubsub.unsubscribe(channel)
-            else:
-                self.pubsub.unsubscribe()
-            logger.info(f"Unsubscribed from channel: {channel or 'all'}")
-
-event_subscriber = EventSubscriber()
+            event = json.loads(data)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to decode message on {channel}: {e}")
+            return
+
+        for callback in list(handlers):
+            try:
+                await callback(event)
+            except Exception as e:
+                logger.error(f"Error processing message for {session_id}: {e}")
+
+
+def stream_id_key(event_id: str) -> Tuple[int, int]:
+    """Sortable form of a Redis stream id ("<ms>-<seq>")"""
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+async def replay_diagnosis_events(session_id: str, last_event_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Read the events appended to a session stream after last_event_id.
+
+    Each event carries its stream id as "event_id" so the client can resume
+    again from the last one it received.
+    """
+    redis = redis_client.get_async_client()
+    key = diagnosis_stream_key(session_id)
+    batch_size = settings.event_replay_batch_size
+    start = f"({last_event_id}" if last_event_id else "-"
+    events: List[Dict[str, Any]] = []
+
+    while True:
+        entries = await redis.xrange(key, min=start, max="+", count=batch_size)
+        for entry_id, fields in entries:
+            try:
+                event = json.loads(fields["event"])
+            except (KeyError, json.JSONDecodeError) as e:
+                logger.error(f"Skipping malformed stream entry {key}/{entry_id}: {e}")
+                continue
+            event["event_id"] = entry_id
+            events.append(event)
+        if len(entries) < batch_size:
+            break
+        start = f"({entries[-1][0]}"
+
+    logger.debug(f"Replayed {len(events)} events for {session_id} after {last_event_id}")
+    return events
+
+
+event_dispatcher = EventDispatcher()
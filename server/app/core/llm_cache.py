@@ -0,0 +1,231 @@
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from app.core.config import settings
+from app.core.redis_client import redis_client
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+LLM_CACHE_STATS_KEY = "llm_cache:stats"
+
+# Volatile tokens that make otherwise identical prompts differ
+_VOLATILE_PATTERNS = [
+    re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"),
+    re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE),
+    re.compile(r"\b0x[0-9a-f]+\b", re.IGNORECASE),
+    re.compile(r"\b\d{10,}\b"),
+]
+_WHITESPACE = re.compile(r"\s+")
+
+EMBEDDING_DIMENSIONS = 512
+NGRAM_SIZE = 3
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Strip timestamps, ids and whitespace noise so repeated symptoms hash alike"""
+    for pattern in _VOLATILE_PATTERNS:
+        prompt = pattern.sub("#", prompt)
+    return _WHITESPACE.sub(" ", prompt).strip().lower()
+
+
+def embed(text: str) -> List[float]:
+    """Local hashed character n-gram embedding, L2-normalized"""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for i in range(max(len(text) - NGRAM_SIZE + 1, 1)):
+        digest = hashlib.md5(text[i:i + NGRAM_SIZE].encode()).digest()
+        vector[int.from_bytes(digest[:4], "little") % EMBEDDING_DIMENSIONS] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+@dataclass
+class CacheEntry:
+    agent_type: str
+    model: str
+    content: str
+    expires_at: float
+    embedding: Optional[List[float]] = None
+
+
+class LLMResponseCache:
+    """Two-tier cache of LLM responses for agent prompts.
+
+    The exact tier is keyed on model plus the normalized prompt hash. The
+    optional similarity tier compares local embeddings of the normalized
+    prompt against entries for the same agent and model and reuses the best
+    match above similarity_threshold. Entries expire after ttl seconds and
+    the least recently used are evicted beyond max_entries. Lookup outcomes
+    are counted in memory and added to the cross-process Redis counters by a
+    background thread every stats_flush_interval seconds, off the agents'
+    event loop.
+    """
+
+    def __init__(self, max_entries: int, ttl: int, similarity_enabled: bool = False,
+                 similarity_threshold: float = 0.95, stats_flush_interval: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_enabled = similarity_enabled
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stats_flush_interval = stats_flush_interval
+        self._unflushed: Dict[str, int] = {}
+        self._pending = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid: Optional[int] = None
+
+    @staticmethod
+    def _key(model: str, normalized: str) -> str:
+        return hashlib.sha256(f"{model}\n{normalized}".encode()).hexdigest()
+
+    def enabled_for(self, agent_type: str) -> bool:
+        return agent_type in settings.llm_cache_agents_list
+
+    def get(self, agent_type: str, model: str, prompt: str) -> Optional[str]:
+        """Cached response for prompt, or None on a miss"""
+        normalized = normalize_prompt(prompt)
+        key = self._key(model, normalized)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                result: Tuple[Optional[str], str] = (entry.content, "exact_hits")
+            else:
+                result = (None, "misses")
+
+        if result[0] is None and self.similarity_enabled:
+            match = self._find_similar(agent_type, model, embed(normalized), now)
+            if match is not None:
+                result = (match, "similar_hits")
+
+        if result[0] is None:
+            with self._lock:
+                self.misses += 1
+        self._record(agent_type, result[1])
+        return result[0]
+
+    def _find_similar(self, agent_type: str, model: str, embedding: List[float], now: float) -> Optional[str]:
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            for key, entry in self._entries.items():
+                if entry.embedding is None or entry.agent_type != agent_type or entry.model != model:
+                    continue
+                if entry.expires_at <= now:
+                    continue
+                score = sum(a * b for a, b in zip(embedding, entry.embedding))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.similar_hits += 1
+            logger.debug(f"LLM cache similarity hit for {agent_type}: score={best_score:.3f}")
+            return self._entries[best_key].content
+
+    def put(self, agent_type: str, model: str, prompt: str, content: str) -> None:
+        normalized = normalize_prompt(prompt)
+        entry = CacheEntry(
+            agent_type=agent_type,
+            model=model,
+            content=content,
+            expires_at=time.monotonic() + self.ttl,
+            embedding=embed(normalized) if self.similarity_enabled else None
+        )
+        key = self._key(model, normalized)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        self.evictions += len(expired)
+
+    def _record(self, agent_type: str, outcome: str) -> None:
+        # Aggregated across API and worker processes for /health/llm-cache
+        with self._lock:
+            for field in (outcome, f"{agent_type}:{outcome}"):
+                self._unflushed[field] = self._unflushed.get(field, 0) + 1
+        self._ensure_flusher()
+        self._pending.set()
+
+    def flush_stats(self) -> None:
+        """Add the counts recorded since the last flush to the Redis counters"""
+        with self._lock:
+            counts, self._unflushed = self._unflushed, {}
+            self._pending.clear()
+        if not counts:
+            return
+        try:
+            pipe = redis_client.get_client().pipeline(transaction=False)
+            for field, count in counts.items():
+                pipe.hincrby(LLM_CACHE_STATS_KEY, field, count)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Failed to record LLM cache stats: {e}")
+            # Keep the counts for the next attempt
+            with self._lock:
+                for field, count in counts.items():
+                    self._unflushed[field] = self._unflushed.get(field, 0) + count
+
+    def _ensure_flusher(self) -> None:
+        # Celery forks workers after import, so the thread is started lazily per process
+        if self._flusher is not None and self._flusher.is_alive() and self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive() and self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._run_flusher, name="llm-cache-stats", daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        while True:
+            self._pending.wait()
+            time.sleep(self.stats_flush_interval)
+            self.flush_stats()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for this process"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def get_cluster_stats() -> Dict[str, int]:
+    """Hit/miss counters summed over every process"""
+    raw = redis_client.get_client().hgetall(LLM_CACHE_STATS_KEY)
+    return {field: int(value) for field, value in raw.items()}
+
+
+llm_response_cache = LLMResponseCache(
+    max_entries=settings.llm_cache_max_entries,
+    ttl=settings.llm_cache_ttl,
+    similarity_enabled=settings.llm_cache_similarity_enabled,
+    similarity_threshold=settings.llm_cache_similarity_threshold
+)
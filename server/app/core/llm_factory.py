@@ -1,15 +1,24 @@
 from typing import Optional, Dict, Any, Tuple
+import asyncio
+import hashlib
+import os
 import time
 import json
+import threading
+import httpx
 from langchain_openai import ChatOpenAI, AzureChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_core.language_models import BaseChatModel
 from langchain_core.callbacks import BaseCallbackHandler
 from app.core.config import settings
+from app.core.broadcast import config_broadcast
 from app.core.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Broadcast topic for LLM provider configuration changes
+LLM_PROVIDERS_TOPIC = "llm_providers"
+
 # Token pricing per 1M tokens (input, output)
 TOKEN_PRICING = {
     "gpt-4-turbo": (10.0, 30.0),
@@ -49,15 +58,133 @@ class TokenUsageCallback(BaseCallbackHandler):
         output_cost = (self.completion_tokens / 1_000_000) * pricing[1]
         return input_cost + output_cost
 
+class LLMClientPool:
+    """Reusable chat model instances sharing per-provider HTTP clients.
+
+    Models are keyed by (provider_id, model, temperature); each provider gets
+    one keep-alive httpx client pair bounded by its max_connections. Entries
+    are rebuilt only when that provider's config fingerprint changes, after a
+    fork, or when used from a different event loop (async connections are
+    bound to the loop that opened them).
+    """
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, str, Any], Tuple[str, Any, BaseChatModel]] = {}
+        self._http_clients: Dict[str, Tuple[str, Any, httpx.Client, httpx.AsyncClient]] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @staticmethod
+    def fingerprint(provider_config: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(provider_config, sort_keys=True, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def _current_loop():
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    def _check_fork(self):
+        # Sockets inherited from the parent process must not be shared
+        if self._pid != os.getpid():
+            self._models.clear()
+            self._http_clients.clear()
+            self._pid = os.getpid()
+
+    def get_model(self, key: Tuple[str, str, Any], fingerprint: str, build) -> BaseChatModel:
+        """Return the pooled model for key, calling build() if it is missing or stale"""
+        loop = self._current_loop()
+        with self._lock:
+            self._check_fork()
+            entry = self._models.get(key)
+            if entry is not None and entry[0] == fingerprint and entry[1] is loop:
+                return entry[2]
+            model = build()
+            self._models[key] = (fingerprint, loop, model)
+            logger.info(f"LLM client pooled: provider={key[0]}, model={key[1]}, temperature={key[2]}")
+            return model
+
+    def get_http_clients(self, provider_id: str, fingerprint: str, max_connections: int) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        """Shared sync/async HTTP clients for a provider; callers hold the pool lock via get_model"""
+        loop = self._current_loop()
+        entry = self._http_clients.get(provider_id)
+        if entry is not None and entry[0] == fingerprint and entry[1] is loop:
+            return entry[2], entry[3]
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry
+        )
+        timeout = httpx.Timeout(settings.llm_request_timeout)
+        clients = (httpx.Client(limits=limits, timeout=timeout), httpx.AsyncClient(limits=limits, timeout=timeout))
+        self._http_clients[provider_id] = (fingerprint, loop, *clients)
+        if entry is not None:
+            self._close_clients(provider_id, *entry[1:])
+        return clients
+
+    @staticmethod
+    def _close_clients(provider_id: str, loop, sync_client: httpx.Client, async_client: httpx.AsyncClient):
+        """Release the connections of replaced clients"""
+        try:
+            sync_client.close()
+        except Exception as e:
+            logger.debug(f"Failed to close HTTP client of {provider_id}: {e}")
+
+        async def aclose():
+            try:
+                await async_client.aclose()
+            except Exception as e:
+                logger.debug(f"Failed to close async HTTP client of {provider_id}: {e}")
+
+        if loop is not None and loop.is_running():
+            # Async connections must be closed on the loop that opened them
+            asyncio.run_coroutine_threadsafe(aclose(), loop)
+        else:
+            # That loop is gone (per-task mode): close on a private one, off this thread
+            threading.Thread(target=lambda: asyncio.run(aclose()), name="llm-client-close", daemon=True).start()
+
 class LLMFactory:
     _instance: Optional['LLMFactory'] = None
-    _last_config = None  # Cache for configuration
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
+            cls._instance._config = None
+            cls._instance._config_loaded_at = 0.0
+            cls._instance._config_generation = 0
+            cls._instance._config_lock = threading.Lock()
+            cls._instance.client_pool = LLMClientPool()
+            config_broadcast.subscribe(LLM_PROVIDERS_TOPIC, cls._instance._drop_provider_cache)
         return cls._instance
 
+    def get_provider_config(self) -> Dict[str, Any]:
+        """Provider configuration, reloaded from the database at most once per TTL"""
+        config_broadcast.ensure_listening()
+        ttl = settings.llm_provider_cache_ttl
+        with self._config_lock:
+            if self._config is not None and time.monotonic() - self._config_loaded_at < ttl:
+                return self._config
+            generation = self._config_generation
+
+        config = self._load_providers_from_db()
+        with self._config_lock:
+            # Don't cache a load that raced with an invalidation
+            if generation == self._config_generation:
+                self._config = config
+                self._config_loaded_at = time.monotonic()
+        return config
+
+    def invalidate_provider_cache(self):
+        """Drop cached provider configuration in this and every other process"""
+        config_broadcast.invalidate(LLM_PROVIDERS_TOPIC)
+
+    def _drop_provider_cache(self):
+        with self._config_lock:
+            self._config = None
+            self._config_generation += 1
+        logger.info("LLM provider configuration cache invalidated")
+
     def _load_providers_from_db(self) -> Dict[str, Any]:
         """Load LLM provider configurations from database"""
         try:
@@ -84,6 +211,7 @@ class LLMFactory:
                     "api_key": provider_config.get("api_key"),
                     "base_url": provider_config.get("base_url"),
                     "models": provider_config.get("models", []),
+                    "max_connections": provider_config.get("max_connections"),
                 }
 
                 # Use is_default column instead of config JSON
@@ -146,8 +274,7 @@ class LLMFactory:
 
     def create_llm(self, provider: Optional[str] = None, model: Optional[str] = None, **kwargs) -> BaseChatModel:
         """Create LLM instance based on provider"""
-        # Load fresh configuration from database
-        config = self._load_providers_from_db()
+        config = self.get_provider_config()
 
         # Determine which provider to use
         if provider:
@@ -161,20 +288,40 @@ class LLMFactory:
         if not provider_config:
             raise ValueError(f"Provider {provider_id} not found")
 
-        provider_type = provider_config["provider"]
-        api_key = provider_config["api_key"]
-        base_url = provider_config.get("base_url")
         models = provider_config.get("models", [])
 
         # Determine model
         if not model:
             model = models[0] if models else "gpt-3.5-turbo"
 
+        # Pool only plain requests; custom callbacks or options get a private instance
+        pooled = set(kwargs) <= {"temperature"}
+        if pooled:
+            key = (provider_id, model, kwargs.get("temperature", 0))
+            fingerprint = self.client_pool.fingerprint(provider_config)
+            return self.client_pool.get_model(
+                key, fingerprint,
+                lambda: self._build_llm(provider_id, provider_config, model, fingerprint=fingerprint, **kwargs)
+            )
+        return self._build_llm(provider_id, provider_config, model, **kwargs)
+
+    def _build_llm(self, provider_id: str, provider_config: Dict[str, Any], model: str,
+                   fingerprint: Optional[str] = None, **kwargs) -> BaseChatModel:
+        provider_type = provider_config["provider"]
+        api_key = provider_config["api_key"]
+        base_url = provider_config.get("base_url")
+
         # Add token tracking callback
-        callbacks = kwargs.get('callbacks', [])
+        callbacks = list(kwargs.get('callbacks', []))
         callbacks.append(TokenUsageCallback(provider_type, model))
         kwargs['callbacks'] = callbacks
 
+        if fingerprint and provider_type in ("openai", "azure", "custom"):
+            max_connections = provider_config.get("max_connections") or settings.llm_max_connections
+            http_client, http_async_client = self.client_pool.get_http_clients(provider_id, fingerprint, max_connections)
+            kwargs["http_client"] = http_client
+            kwargs["http_async_client"] = http_async_client
+
         try:
             if provider_type == "openai":
                 return self._create_openai(model, api_key, base_url, **kwargs)
@@ -196,7 +343,7 @@ class LLMFactory:
             model=model,
             api_key=api_key,
             base_url=base_url,
-            temperature=kwargs.get("temperature", 0),
+            temperature=kwargs.pop("temperature", 0),
             **kwargs
         )
 
@@ -205,7 +352,7 @@ class LLMFactory:
         return ChatAnthropic(
             model=model,
             api_key=api_key,
-            temperature=kwargs.get("temperature", 0),
+            temperature=kwargs.pop("temperature", 0),
             **kwargs
         )
 
@@ -215,13 +362,13 @@ class LLMFactory:
             deployment_name=model,
             azure_endpoint=endpoint,
             api_key=api_key,
-            temperature=kwargs.get("temperature", 0),
+            temperature=kwargs.pop("temperature", 0),
             **kwargs
         )
 
     def create_with_fallback(self, max_retries: int = 3, **kwargs) -> BaseChatModel:
         """Create LLM with fallback chain and retry logic"""
-        config = self._load_providers_from_db()
+        config = self.get_provider_config()
 
         primary_id = config.get("primary")
         fallback_id = config.get("fallback")
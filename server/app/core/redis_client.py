@@ -1,5 +1,7 @@
 from redis import Redis
 from redis.connection import ConnectionPool
+from redis.asyncio import Redis as AsyncRedis
+from redis.asyncio.connection import ConnectionPool as AsyncConnectionPool
 from app.core.config import settings
 from app.core.logging_config import get_logger
 from typing import Optional
@@ -9,6 +11,7 @@ logger = get_logger(__name__)
 class RedisClient:
     _instance: Optional['RedisClient'] = None
     _pool: Optional[ConnectionPool] = None
+    _async_pool: Optional[AsyncConnectionPool] = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -28,6 +31,17 @@ class RedisClient:
         """Get Redis client from pool"""
         return Redis(connection_pool=self._pool)
 
+    def get_async_client(self) -> AsyncRedis:
+        """Get asyncio Redis client for use inside the event loop"""
+        if self._async_pool is None:
+            self._async_pool = AsyncConnectionPool.from_url(
+                settings.redis_url,
+                max_connections=50,
+                decode_responses=True
+            )
+            logger.info(f"Redis asyncio connection pool created: {settings.redis_url}")
+        return AsyncRedis(connection_pool=self._async_pool)
+
     def health_check(self) -> bool:
         """Check Redis connection health"""
         try:
@@ -0,0 +1,105 @@
+from typing import Callable, Dict, Optional, Tuple
+import hashlib
+import json
+from app.core.redis_client import redis_client
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+RESPONSE_CACHE_PREFIX = "response_cache:"
+RESPONSE_CACHE_STATS_KEY = "response_cache:stats"
+
+DASHBOARD_CACHE_NAMESPACE = "dashboard"
+
+
+class ResponseCache:
+    """Read-through Redis cache of serialized API responses, with ETags.
+
+    Each namespace holds one response body and its ETag for ttl seconds.
+    Repositories whose tables feed a namespace invalidate it after every
+    committed write, which also bumps the namespace generation so a build
+    that raced with the write is not stored. Hit/miss counters are
+    aggregated across processes in Redis.
+    """
+
+    def __init__(self):
+        self.redis = redis_client.get_client()
+
+    @staticmethod
+    def _key(namespace: str) -> str:
+        return f"{RESPONSE_CACHE_PREFIX}{namespace}"
+
+    @staticmethod
+    def _generation_key(namespace: str) -> str:
+        return f"{RESPONSE_CACHE_PREFIX}{namespace}:generation"
+
+    @staticmethod
+    def make_etag(body: str) -> str:
+        return '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        if not if_none_match:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+    def get_or_build(self, namespace: str, build: Callable[[], str], ttl: int) -> Tuple[str, str]:
+        """Cached (body, etag) for namespace, calling build() on a miss"""
+        if ttl <= 0:
+            body = build()
+            return body, self.make_etag(body)
+
+        key = self._key(namespace)
+        try:
+            cached, generation = self.redis.mget(key, self._generation_key(namespace))
+        except Exception as e:
+            logger.warning(f"Response cache unavailable for {namespace}: {e}")
+            body = build()
+            return body, self.make_etag(body)
+
+        if cached is not None:
+            entry = json.loads(cached)
+            self.record(namespace, "hits")
+            return entry["body"], entry["etag"]
+
+        self.record(namespace, "misses")
+        body = build()
+        etag = self.make_etag(body)
+        try:
+            # Skip storing if a write invalidated the namespace while building
+            if self.redis.get(self._generation_key(namespace)) == generation:
+                self.redis.set(key, json.dumps({"body": body, "etag": etag}), ex=ttl)
+        except Exception as e:
+            logger.warning(f"Failed to store cached response for {namespace}: {e}")
+        return body, etag
+
+    def invalidate(self, namespace: str) -> None:
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.incr(self._generation_key(namespace))
+            pipe.delete(self._key(namespace))
+            pipe.execute()
+            self.record(namespace, "invalidations")
+        except Exception as e:
+            logger.error(f"Failed to invalidate response cache {namespace}: {e}")
+
+    def record(self, namespace: str, outcome: str) -> None:
+        try:
+            self.redis.hincrby(RESPONSE_CACHE_STATS_KEY, f"{namespace}:{outcome}", 1)
+        except Exception as e:
+            logger.debug(f"Failed to record response cache stats: {e}")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Counters and hit rate per namespace, across every process"""
+        stats: Dict[str, Dict[str, float]] = {}
+        for field, value in self.redis.hgetall(RESPONSE_CACHE_STATS_KEY).items():
+            namespace, _, outcome = field.rpartition(":")
+            stats.setdefault(namespace, {})[outcome] = int(value)
+        for counters in stats.values():
+            lookups = counters.get("hits", 0) + counters.get("misses", 0)
+            counters["hit_rate"] = round(counters.get("hits", 0) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,91 @@
+from typing import Any, Deque, Dict, List, Optional
+from collections import deque
+import asyncio
+import time
+
+# Only the latest queued message of these types matters to the client
+COALESCED_TYPES = {"confidence_update", "timeline_update"}
+# Safe to discard under backpressure: keep-alives and node progress markers.
+# Everything else (terminal events, prompts, streamed deltas) must be delivered.
+DROPPABLE_TYPES = {"heartbeat", "workflow_node_entered", "workflow_node_completed"}
+
+
+class SendQueue:
+    """Bounded outbound message queue for one WebSocket.
+
+    A queued confidence/timeline update is replaced in place by a newer one,
+    so superseded state never reaches a lagging client. When the queue is
+    full, a droppable message is discarded: the new one if it is droppable,
+    otherwise the oldest droppable one queued. If there is none to discard,
+    put() refuses the message and the caller must disconnect the client,
+    since it can no longer be kept consistent. full_since records when the
+    client started lagging.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._slots: Deque[List[Dict[str, Any]]] = deque()
+        self._latest: Dict[str, List[Dict[str, Any]]] = {}
+        self._ready = asyncio.Event()
+        self.full_since: Optional[float] = None
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def put(self, message: Dict[str, Any]) -> bool:
+        """Enqueue without blocking; returns False if a message that must be delivered did not fit"""
+        message_type = message.get("type")
+
+        slot = self._latest.get(message_type)
+        if slot is not None:
+            slot[0] = message
+            self.coalesced += 1
+            return True
+
+        if len(self._slots) >= self.maxsize:
+            if self.full_since is None:
+                self.full_since = time.monotonic()
+            self.dropped += 1
+            if message_type in DROPPABLE_TYPES:
+                return True
+            if not self._evict_droppable():
+                return False
+
+        slot = [message]
+        self._slots.append(slot)
+        if message_type in COALESCED_TYPES:
+            self._latest[message_type] = slot
+        self._ready.set()
+        return True
+
+    def _evict_droppable(self) -> bool:
+        for index, slot in enumerate(self._slots):
+            if slot[0].get("type") in DROPPABLE_TYPES:
+                del self._slots[index]
+                return True
+        return False
+
+    async def get(self) -> Dict[str, Any]:
+        """Wait for and remove the oldest message"""
+        while not self._slots:
+            self._ready.clear()
+            await self._ready.wait()
+
+        slot = self._slots.popleft()
+        message = slot[0]
+        message_type = message.get("type")
+        if self._latest.get(message_type) is slot:
+            del self._latest[message_type]
+        if len(self._slots) <= self.maxsize // 2:
+            # Only a client that has caught up halfway stops counting as lagging
+            self.full_since = None
+        return message
+
+    def lagging_for(self) -> float:
+        """Seconds since the queue overflowed without draining (0 if it has not)"""
+        if self.full_since is None:
+            return 0.0
+        return time.monotonic() - self.full_since
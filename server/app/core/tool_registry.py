@@ -12,6 +12,7 @@ class ToolRegistry:
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance._tools = {}
+            cls._instance._version = 0
             cls._instance._agent_tool_map = {
                 "coordinator": [],
                 "log": ["elk_query"],
@@ -38,6 +39,7 @@ class ToolRegistry:
             raise ValueError(f"Tool '{name}' already registered")
 
         self._tools[name] = tool
+        self._config_changed()
         logger.info(f"Tool registered: {name}")
 
     def get_tool(self, name: str) -> Optional[BaseTool]:
@@ -59,8 +61,18 @@ class ToolRegistry:
     def set_agent_tools(self, agent_type: str, tool_names: List[str]):
         """Configure which tools an agent can use"""
         self._agent_tool_map[agent_type] = tool_names
+        self._config_changed()
         logger.info(f"Agent '{agent_type}' configured with tools: {tool_names}")
 
+    @property
+    def version(self) -> int:
+        """Incremented whenever tools or agent tool assignments change"""
+        return self._version
+
+    def _config_changed(self):
+        self._version += 1
+        self.get_tools_for_agent.cache_clear()
+
     def list_tools(self) -> List[str]:
         """List all registered tool names"""
         return list(self._tools.keys())
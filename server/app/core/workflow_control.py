@@ -0,0 +1,264 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import threading
+import time
+from app.core.redis_client import redis_client
+from app.core.config import settings
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+WORKFLOW_CONTROL_CHANNEL = "workflow:control"
+PAUSED_KEY_PREFIX = "workflow:paused:"
+CANCELLED_KEY_PREFIX = "workflow:cancelled:"
+TASK_KEY_PREFIX = "workflow:task:"
+CONFIRMATION_KEY_PREFIX = "workflow:confirmation:"
+
+RESUME_SIGNAL = "resume"
+CANCEL_SIGNAL = "cancel"
+
+Waiter = Tuple[asyncio.AbstractEventLoop, asyncio.Event]
+
+
+class WorkflowCancelled(Exception):
+    """Raised when a running workflow was cancelled through the control plane"""
+    pass
+
+
+class WorkflowControl:
+    """Pause/resume/cancel and confirmation signalling between API and worker processes.
+
+    State lives in Redis keys so a worker that checks late still sees it;
+    changes are announced on one pub/sub channel that a daemon thread per
+    process turns into asyncio.Event wake-ups for local waiters. Waiting
+    sessions therefore cost no polling, and wake within a Redis round trip.
+    Waiters also re-check every recheck_interval seconds, so state that
+    changes without a signal (an expired pause key) is still noticed. The
+    Redis calls made from coroutines run in an executor, off the loop.
+
+    Cancellation is enforced twice: graph nodes check it cooperatively at
+    every checkpoint(), and the worker running the session cancels its
+    asyncio task so in-flight LLM calls stop immediately.
+    """
+
+    def __init__(self, channel: str = WORKFLOW_CONTROL_CHANNEL, reconnect_delay: float = 1.0,
+                 recheck_interval: float = 30.0):
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.recheck_interval = recheck_interval
+        self.redis = redis_client.get_client()
+        self._waiters: Dict[Tuple[str, str], Set[Waiter]] = {}
+        self._running: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Task]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._listener_pid: Optional[int] = None
+
+    @property
+    def key_ttl(self) -> int:
+        return settings.celery_task_timeout
+
+    def pause(self, session_id: str) -> None:
+        self.redis.set(f"{PAUSED_KEY_PREFIX}{session_id}", 1, ex=self.key_ttl)
+        logger.info(f"Workflow pause requested: {session_id}")
+
+    def resume(self, session_id: str) -> None:
+        self.redis.delete(f"{PAUSED_KEY_PREFIX}{session_id}")
+        self._signal(session_id, RESUME_SIGNAL)
+        logger.info(f"Workflow resume requested: {session_id}")
+
+    def is_paused(self, session_id: str) -> bool:
+        return bool(self.redis.exists(f"{PAUSED_KEY_PREFIX}{session_id}"))
+
+    def is_cancelled(self, session_id: str) -> bool:
+        return bool(self.redis.exists(f"{CANCELLED_KEY_PREFIX}{session_id}"))
+
+    def cancel(self, session_id: str) -> bool:
+        """Cancel a session's workflow wherever it runs, queued or retrying; False if no task is known for it"""
+        self.redis.set(f"{CANCELLED_KEY_PREFIX}{session_id}", 1, ex=self.key_ttl)
+        task_id = self.redis.get(f"{TASK_KEY_PREFIX}{session_id}")
+        if task_id:
+            # Keeps a still-queued task from starting at all
+            from app.core.celery_app import celery_app
+            try:
+                celery_app.control.revoke(task_id)
+            except Exception as e:
+                logger.warning(f"Failed to revoke task {task_id} for {session_id}: {e}")
+        self._signal(session_id, CANCEL_SIGNAL)
+        logger.info(f"Workflow cancel requested: {session_id}, task: {task_id}")
+        return task_id is not None
+
+    def reset(self, session_id: str) -> None:
+        """Clear control state left by an earlier run before starting a new one"""
+        self.redis.delete(f"{CANCELLED_KEY_PREFIX}{session_id}", f"{PAUSED_KEY_PREFIX}{session_id}")
+
+    def bind_task(self, session_id: str, task_id: str) -> None:
+        """Record the Celery task for a session, from submission on, so cancel() can revoke it"""
+        self.redis.set(f"{TASK_KEY_PREFIX}{session_id}", task_id, ex=self.key_ttl)
+
+    def finish(self, session_id: str) -> None:
+        """Clear run-scoped control keys once a run ends for good; the cancelled marker expires on its own"""
+        self.redis.delete(f"{TASK_KEY_PREFIX}{session_id}", f"{PAUSED_KEY_PREFIX}{session_id}")
+
+    async def run_cancellable(self, session_id: str, coro: Awaitable[Any]) -> Any:
+        """Await coro as this process's running task for session_id.
+
+        A cancel() from any process cancels it; that surfaces here as
+        WorkflowCancelled rather than a bare CancelledError.
+        """
+        entry = (asyncio.get_running_loop(), asyncio.current_task())
+        with self._lock:
+            self._running[session_id] = entry
+        self.ensure_listening()
+        try:
+            if await self._call(self.is_cancelled, session_id):
+                raise WorkflowCancelled(session_id)
+            return await coro
+        except asyncio.CancelledError:
+            if await self._call(self.is_cancelled, session_id):
+                raise WorkflowCancelled(session_id)
+            raise
+        finally:
+            with self._lock:
+                if self._running.get(session_id) is entry:
+                    del self._running[session_id]
+
+    async def checkpoint(self, session_id: str) -> bool:
+        """Block while the session is paused; returns True if it has been cancelled"""
+        paused, cancelled = await self._call(
+            self.redis.mget, f"{PAUSED_KEY_PREFIX}{session_id}", f"{CANCELLED_KEY_PREFIX}{session_id}"
+        )
+        if cancelled:
+            return True
+        if paused:
+            logger.info(f"Workflow waiting while paused: {session_id}")
+            await self._wait(session_id, RESUME_SIGNAL, lambda: self._resumed_or_cancelled(session_id))
+            return await self._call(self.is_cancelled, session_id)
+        return False
+
+    def _resumed_or_cancelled(self, session_id: str) -> Optional[bool]:
+        paused, cancelled = self.redis.mget(f"{PAUSED_KEY_PREFIX}{session_id}", f"{CANCELLED_KEY_PREFIX}{session_id}")
+        return True if cancelled or not paused else None
+
+    def send_confirmation(self, session_id: str, confirmation_id: str, response: Dict[str, Any]) -> None:
+        """Deliver a user's answer to whichever process is waiting for it"""
+        key = f"{CONFIRMATION_KEY_PREFIX}{session_id}:{confirmation_id}"
+        self.redis.set(key, json.dumps(response), ex=self.key_ttl)
+        self._signal(session_id, f"confirm:{confirmation_id}")
+
+    async def wait_for_confirmation(self, session_id: str, confirmation_id: str,
+                                    timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Wait for send_confirmation(); raises asyncio.TimeoutError after timeout seconds"""
+        key = f"{CONFIRMATION_KEY_PREFIX}{session_id}:{confirmation_id}"
+
+        def check():
+            value = self.redis.get(key)
+            return json.loads(value) if value is not None else None
+
+        response = await asyncio.wait_for(self._wait(session_id, f"confirm:{confirmation_id}", check), timeout)
+        await self._call(self.redis.delete, key)
+        return response
+
+    @staticmethod
+    async def _call(func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _signal(self, session_id: str, signal: str) -> None:
+        try:
+            self.redis.publish(self.channel, json.dumps({"session_id": session_id, "signal": signal}))
+        except Exception as e:
+            logger.error(f"Failed to publish workflow signal {signal} for {session_id}: {e}")
+        # Local waiters don't need the round trip
+        self._wake(session_id, signal)
+
+    async def _wait(self, session_id: str, signal: str, check: Callable[[], Any]) -> Any:
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        key = (session_id, signal)
+        with self._lock:
+            self._waiters.setdefault(key, set()).add(waiter)
+        self.ensure_listening()
+        try:
+            # Re-check after registering so a signal sent meanwhile is not lost
+            while True:
+                result = await self._call(check)
+                if result is not None:
+                    return result
+                try:
+                    await asyncio.wait_for(event.wait(), self.recheck_interval)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[key]
+
+    def _wake(self, session_id: Optional[str] = None, signal: Optional[str] = None) -> None:
+        """Wake waiters for one signal, or all of them when called without arguments"""
+        with self._lock:
+            if session_id is None:
+                waiters = [w for group in self._waiters.values() for w in group]
+            else:
+                waiters = list(self._waiters.get((session_id, signal), ()))
+        if signal == CANCEL_SIGNAL:
+            # A paused workflow must wake up to notice it was cancelled
+            with self._lock:
+                waiters += list(self._waiters.get((session_id, RESUME_SIGNAL), ()))
+                running = self._running.get(session_id)
+            if running is not None:
+                loop, task = running
+                logger.info(f"Cancelling running workflow task: {session_id}")
+                try:
+                    loop.call_soon_threadsafe(task.cancel)
+                except RuntimeError:
+                    pass
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # Loop already closed
+
+    def ensure_listening(self) -> None:
+        # Celery forks workers after import, so the thread is started lazily per process
+        if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._listener = threading.Thread(target=self._run_listener, name="workflow-control", daemon=True)
+            self._listener.start()
+
+    def _run_listener(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                # Signals sent before (re)subscribing were missed: let waiters re-check
+                self._wake()
+                logger.info(f"Workflow control listening on: {self.channel}")
+                for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    try:
+                        payload = json.loads(message['data'])
+                    except json.JSONDecodeError as e:
+                        logger.error(f"Failed to decode workflow signal: {e}")
+                        continue
+                    self._wake(payload.get("session_id"), payload.get("signal"))
+            except Exception as e:
+                logger.error(f"Workflow control connection error, reconnecting: {e}")
+                time.sleep(self.reconnect_delay)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+workflow_control = WorkflowControl()
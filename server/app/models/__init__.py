@@ -7,6 +7,7 @@ from app.models.case import (
     KnowledgeEdge,
     HistoricalCase,
     DashboardStats,
+    DashboardRollup,
     Setting,
 )
 
@@ -19,5 +20,6 @@ __all__ = [
     "KnowledgeEdge",
     "HistoricalCase",
     "DashboardStats",
+    "DashboardRollup",
     "Setting",
 ]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, ForeignKey, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -85,13 +85,34 @@ class DashboardStats(Base):
     __tablename__ = "dashboard_stats"
 
     id = Column(Integer, primary_key=True, index=True)
+    # Natural key of the single statistics row, so it can be upserted
+    singleton = Column(Boolean, unique=True, default=True)
     active_tasks = Column(Integer, default=0)
     success_rate = Column(Float, default=0.0)
     avg_resolution_time = Column(String(20), nullable=True)
     total_cases = Column(Integer, default=0)
+    # Running totals that success_rate and avg_resolution_time are derived from
+    completed_cases = Column(Integer, default=0)
+    failed_cases = Column(Integer, default=0)
+    cancelled_cases = Column(Integer, default=0)
+    total_resolution_seconds = Column(Float, default=0.0)
     updated_at = Column(DateTime, onupdate=func.now())
 
 
+class DashboardRollup(Base):
+    __tablename__ = "dashboard_rollups"
+    __table_args__ = (UniqueConstraint("granularity", "bucket_start", name="uq_dashboard_rollups_bucket"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(8), nullable=False)  # hour / day
+    bucket_start = Column(DateTime, nullable=False, index=True)
+    started = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+    total_resolution_seconds = Column(Float, nullable=False, default=0.0)
+
+
 class Setting(Base):
     __tablename__ = "settings"
 
@@ -3,9 +3,12 @@ from sqlalchemy.orm import Session
 from app.models.case import Agent
 from app.repositories.base import BaseRepository
 from app.core.database import with_session
+from app.core.response_cache import DASHBOARD_CACHE_NAMESPACE
 
 
 class AgentRepository(BaseRepository[Agent]):
+    cache_namespaces = (DASHBOARD_CACHE_NAMESPACE,)
+
     def __init__(self):
         super().__init__(Agent)
 
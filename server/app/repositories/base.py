@@ -1,15 +1,24 @@
-from typing import TypeVar, Type, Generic, List, Optional
+from typing import TypeVar, Type, Generic, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import select, update, delete
-from app.core.database import with_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, func
+from app.core.database import with_session, with_async_session
+from app.core.response_cache import response_cache
 
 ModelType = TypeVar("ModelType")
 
 
 class BaseRepository(Generic[ModelType]):
+    # Cached API responses built from this table, dropped after committed writes
+    cache_namespaces: Tuple[str, ...] = ()
+
     def __init__(self, model: Type[ModelType]):
         self.model = model
 
+    def _after_write(self):
+        for namespace in self.cache_namespaces:
+            response_cache.invalidate(namespace)
+
     @with_session
     def get_by_id(self, session: Session, id: int) -> Optional[ModelType]:
         obj = session.query(self.model).filter(self.model.id == id).first()
@@ -92,3 +101,93 @@ class BaseRepository(Generic[ModelType]):
         result = session.query(self.model).filter(self.model.id.in_(ids)).delete(synchronize_session=False)
         session.flush()
         return result
+
+    # Async variants for code on the event loop; Celery tasks and scripts
+    # keep using the sync methods above
+
+    @with_async_session
+    async def aget_by_id(self, session: AsyncSession, id: int) -> Optional[ModelType]:
+        obj = await session.get(self.model, id)
+        if obj:
+            session.expunge(obj)
+        return obj
+
+    @with_async_session
+    async def aget_all(self, session: AsyncSession, skip: int = 0, limit: int = 100) -> List[ModelType]:
+        objs = (await session.scalars(select(self.model).offset(skip).limit(limit))).all()
+        for obj in objs:
+            session.expunge(obj)
+        return list(objs)
+
+    @with_async_session
+    async def acreate(self, session: AsyncSession, **kwargs) -> ModelType:
+        db_obj = self.model(**kwargs)
+        session.add(db_obj)
+        await session.flush()
+        await session.refresh(db_obj)
+        session.expunge(db_obj)
+        return db_obj
+
+    @with_async_session
+    async def aupdate(self, session: AsyncSession, id: int, **kwargs) -> Optional[ModelType]:
+        db_obj = await session.get(self.model, id)
+        if db_obj:
+            for key, value in kwargs.items():
+                setattr(db_obj, key, value)
+            await session.flush()
+            await session.refresh(db_obj)
+            session.expunge(db_obj)
+        return db_obj
+
+    @with_async_session
+    async def adelete(self, session: AsyncSession, id: int) -> bool:
+        db_obj = await session.get(self.model, id)
+        if db_obj:
+            await session.delete(db_obj)
+            return True
+        return False
+
+    @with_async_session
+    async def acount(self, session: AsyncSession) -> int:
+        return await session.scalar(select(func.count()).select_from(self.model))
+
+    @with_async_session
+    async def aexists(self, session: AsyncSession, **kwargs) -> bool:
+        return (await session.scalars(select(self.model).filter_by(**kwargs).limit(1))).first() is not None
+
+    @with_async_session
+    async def aget_by(self, session: AsyncSession, **kwargs) -> Optional[ModelType]:
+        obj = (await session.scalars(select(self.model).filter_by(**kwargs).limit(1))).first()
+        if obj:
+            session.expunge(obj)
+        return obj
+
+    @with_async_session
+    async def aget_all_by(self, session: AsyncSession, **kwargs) -> List[ModelType]:
+        objs = (await session.scalars(select(self.model).filter_by(**kwargs))).all()
+        for obj in objs:
+            session.expunge(obj)
+        return list(objs)
+
+    @with_async_session
+    async def abulk_create(self, session: AsyncSession, objects: List[dict]) -> List[ModelType]:
+        db_objs = [self.model(**obj) for obj in objects]
+        session.add_all(db_objs)
+        await session.flush()
+        for obj in db_objs:
+            session.expunge(obj)
+        return db_objs
+
+    @with_async_session
+    async def abulk_update(self, session: AsyncSession, ids: List[int], **kwargs) -> int:
+        result = await session.execute(
+            update(self.model).where(self.model.id.in_(ids)).values(**kwargs).execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    @with_async_session
+    async def abulk_delete(self, session: AsyncSession, ids: List[int]) -> int:
+        result = await session.execute(
+            delete(self.model).where(self.model.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        return result.rowcount
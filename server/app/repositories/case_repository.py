@@ -4,9 +4,12 @@ from sqlalchemy import desc
 from app.models.case import Case
 from app.repositories.base import BaseRepository
 from app.core.database import with_session
+from app.core.response_cache import DASHBOARD_CACHE_NAMESPACE
 
 
 class CaseRepository(BaseRepository[Case]):
+    cache_namespaces = (DASHBOARD_CACHE_NAMESPACE,)
+
     def __init__(self):
         super().__init__(Case)
 
@@ -1,11 +1,31 @@
-from typing import Optional
+from typing import List, Optional
+from sqlalchemy import desc, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from app.models.case import DashboardStats
+from app.models.case import Case, DashboardStats, DashboardRollup
 from app.repositories.base import BaseRepository
 from app.core.database import with_session
+from app.core.response_cache import DASHBOARD_CACHE_NAMESPACE
+
+# Case status while a diagnosis runs, and once it finished with each outcome
+CASE_STATUS_RUNNING = "investigating"
+OUTCOME_CASE_STATUS = {"completed": "resolved", "failed": "failed", "cancelled": "cancelled"}
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+ROLLUP_COUNTERS = ("started", "completed", "failed", "cancelled", "total_resolution_seconds")
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{int(round(seconds))}s"
+    if seconds < 3600:
+        return f"{int(round(seconds / 60))}min"
+    return f"{seconds / 3600:.1f}h"
 
 
 class DashboardStatsRepository(BaseRepository[DashboardStats]):
+    cache_namespaces = (DASHBOARD_CACHE_NAMESPACE,)
+
     def __init__(self):
         super().__init__(DashboardStats)
 
@@ -88,3 +108,102 @@ class DashboardStatsRepository(BaseRepository[DashboardStats]):
         session.flush()
         session.refresh(stats)
         return stats
+
+    # Incremental statistics: each diagnosis start/finish adjusts the single
+    # stats row and its hourly/daily rollup buckets, so reads never scan cases.
+    # The diagnosis's Case row (case_id = session id) makes both idempotent
+    # when a task is retried or redelivered.
+
+    @with_session
+    def record_diagnosis_started(self, session: Session, session_id: str, symptom: str,
+                                 lead_agent: str = "coordinator") -> bool:
+        """Count a diagnosis as started; False if it is already counted as running"""
+        case = session.query(Case).filter(Case.case_id == session_id).with_for_update().first()
+        if case is not None and case.status == CASE_STATUS_RUNNING:
+            return False
+
+        self._ensure_stats_row(session)
+        increments = {DashboardStats.active_tasks: DashboardStats.active_tasks + 1}
+        if case is None:
+            session.add(Case(case_id=session_id, symptom=symptom, status=CASE_STATUS_RUNNING, lead_agent=lead_agent))
+            increments[DashboardStats.total_cases] = DashboardStats.total_cases + 1
+        else:
+            case.status = CASE_STATUS_RUNNING
+        session.query(DashboardStats).update(increments, synchronize_session=False)
+        self._bump_rollups(session, started=1)
+        session.flush()
+        return True
+
+    @with_session
+    def record_diagnosis_finished(self, session: Session, session_id: str, outcome: str,
+                                  confidence: Optional[int] = None) -> bool:
+        """Count a running diagnosis as completed, failed or cancelled; False if it was not running"""
+        case = session.query(Case).filter(Case.case_id == session_id).with_for_update().first()
+        if case is None or case.status != CASE_STATUS_RUNNING:
+            return False
+
+        seconds = 0.0
+        if outcome == "completed":
+            elapsed = session.scalar(
+                select(func.extract("epoch", func.now() - func.coalesce(Case.updated_at, Case.created_at)))
+                .where(Case.id == case.id)
+            )
+            seconds = max(float(elapsed or 0), 0.0)
+        case.status = OUTCOME_CASE_STATUS[outcome]
+        if confidence is not None:
+            case.confidence = confidence
+
+        self._ensure_stats_row(session)
+        counter = getattr(DashboardStats, f"{outcome}_cases")
+        session.query(DashboardStats).update({
+            DashboardStats.active_tasks: func.greatest(DashboardStats.active_tasks - 1, 0),
+            counter: counter + 1,
+            DashboardStats.total_resolution_seconds: DashboardStats.total_resolution_seconds + seconds,
+        }, synchronize_session=False)
+        self._refresh_derived(session)
+        self._bump_rollups(session, **{outcome: 1, "total_resolution_seconds": seconds})
+        session.flush()
+        return True
+
+    @with_session
+    def get_rollups(self, session: Session, granularity: str = "hour", limit: int = 24) -> List[DashboardRollup]:
+        """Most recent rollup buckets, newest first"""
+        rollups = (session.query(DashboardRollup)
+                   .filter(DashboardRollup.granularity == granularity)
+                   .order_by(desc(DashboardRollup.bucket_start))
+                   .limit(limit)
+                   .all())
+        for rollup in rollups:
+            session.expunge(rollup)
+        return rollups
+
+    @staticmethod
+    def _ensure_stats_row(session: Session):
+        if session.query(DashboardStats.id).first() is None:
+            session.execute(pg_insert(DashboardStats).values(
+                singleton=True, active_tasks=0, success_rate=0.0, total_cases=0, completed_cases=0,
+                failed_cases=0, cancelled_cases=0, total_resolution_seconds=0.0
+            ).on_conflict_do_nothing(index_elements=["singleton"]))
+
+    @staticmethod
+    def _refresh_derived(session: Session):
+        stats = session.query(DashboardStats).populate_existing().first()
+        finished = (stats.completed_cases or 0) + (stats.failed_cases or 0)
+        stats.success_rate = round(100.0 * (stats.completed_cases or 0) / finished, 1) if finished else 0.0
+        if stats.completed_cases:
+            stats.avg_resolution_time = format_duration((stats.total_resolution_seconds or 0.0) / stats.completed_cases)
+
+    @staticmethod
+    def _bump_rollups(session: Session, **increments):
+        for granularity in ROLLUP_GRANULARITIES:
+            values = {counter: increments.get(counter, 0) for counter in ROLLUP_COUNTERS}
+            stmt = pg_insert(DashboardRollup).values(
+                granularity=granularity,
+                bucket_start=func.date_trunc(granularity, func.now()),
+                **values
+            )
+            stmt = stmt.on_conflict_do_update(
+                constraint="uq_dashboard_rollups_bucket",
+                set_={counter: getattr(DashboardRollup, counter) + stmt.excluded[counter] for counter in ROLLUP_COUNTERS}
+            )
+            session.execute(stmt)
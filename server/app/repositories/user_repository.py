@@ -1,8 +1,10 @@
 from typing import Optional, List
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import User
 from app.repositories.base import BaseRepository
-from app.core.database import with_session
+from app.core.database import with_session, with_async_session
 
 
 class UserRepository(BaseRepository[User]):
@@ -65,3 +67,18 @@ class UserRepository(BaseRepository[User]):
     @with_session
     def email_exists(self, session: Session, email: str) -> bool:
         return session.query(User).filter(User.email == email).first() is not None
+
+    @with_async_session
+    async def aget_by_username(self, session: AsyncSession, username: str) -> Optional[User]:
+        user = (await session.scalars(select(User).where(User.username == username).limit(1))).first()
+        if user:
+            session.expunge(user)
+        return user
+
+    @with_async_session
+    async def ausername_exists(self, session: AsyncSession, username: str) -> bool:
+        return (await session.scalars(select(User.id).where(User.username == username).limit(1))).first() is not None
+
+    @with_async_session
+    async def aemail_exists(self, session: AsyncSession, email: str) -> bool:
+        return (await session.scalars(select(User.id).where(User.email == email).limit(1))).first() is not None
@@ -33,6 +33,15 @@ class SystemHealthResponse(BaseModel):
     latency: str
 
 
+class DashboardTrendBucketResponse(BaseModel):
+    bucket_start: str
+    started: int
+    completed: int
+    failed: int
+    cancelled: int
+    avg_resolution_time: str
+
+
 class DashboardDataResponse(BaseModel):
     stats: DashboardStatsResponse
     recent_cases: List[CaseResponse]
@@ -172,6 +181,7 @@ class LLMProviderRequest(BaseModel):
     api_key: str
     base_url: Optional[str] = None
     models: Optional[List[str]] = None
+    max_connections: Optional[int] = None  # Defaults to LLM_MAX_CONNECTIONS
     is_default: bool = False
 
 
@@ -182,6 +192,7 @@ class LLMProviderResponse(BaseModel):
     api_key: str  # Will be decrypted for display
     base_url: Optional[str] = None
     models: List[str]
+    max_connections: Optional[int] = None
     is_default: bool
     enabled: bool
 
@@ -191,6 +202,7 @@ class LLMProviderUpdateRequest(BaseModel):
     api_key: Optional[str] = None
     base_url: Optional[str] = None
     models: Optional[List[str]] = None
+    max_connections: Optional[int] = None
     is_default: Optional[bool] = None
     enabled: Optional[bool] = None
 
@@ -3,6 +3,7 @@ from typing import AsyncIterator, Dict, Any, Optional
 from datetime import datetime
 import asyncio
 import uuid
+from app.core.workflow_control import workflow_control
 
 
 class BaseAgent(ABC):
@@ -32,14 +33,6 @@ class BaseAgent(ABC):
     ) -> AsyncIterator[Dict[str, Any]]:
         pass
     
-    def handle_confirmation_response(self, confirmation_id: str, response: Dict[str, Any]) -> bool:
-        if self.pending_confirmation and self.pending_confirmation.get("id") == confirmation_id:
-            self.confirmation_result = response
-            self.paused_for_confirmation = False
-            self.pending_confirmation = None
-            return True
-        return False
-    
     def get_pending_confirmation(self) -> Optional[Dict[str, Any]]:
         return self.pending_confirmation
     
@@ -99,9 +92,32 @@ class BaseAgent(ABC):
         await callback(message)
         return message
     
-    async def wait_for_confirmation(self, timeout: int = 300):
-        start_time = datetime.now()
-        while self.paused_for_confirmation:
-            if (datetime.now() - start_time).total_seconds() > timeout:
-                raise TimeoutError(f"Confirmation timeout after {timeout} seconds")
-            await asyncio.sleep(0.5)
+    async def wait_for_confirmation(self, session_id: str, timeout: int = 300) -> Dict[str, Any]:
+        """Wait for the user's answer to pending_confirmation.
+
+        The answer arrives through workflow_control from whichever API
+        process holds the user's socket, keyed by the confirmation id the
+        client echoes back (confirmation_response, or approve_action and
+        reject_action). Its "action" is an option value, or is resolved to
+        one: approve picks the chosen "value" or defaultOption, reject and
+        cancel pick rejectOption.
+        """
+        if not session_id:
+            raise ValueError("Confirmation needs the diagnosis session_id to receive an answer")
+        confirmation = self.pending_confirmation
+        self.paused_for_confirmation = True
+        try:
+            response = await workflow_control.wait_for_confirmation(session_id, confirmation["id"], timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Confirmation timeout after {timeout} seconds")
+        finally:
+            self.paused_for_confirmation = False
+            self.pending_confirmation = None
+
+        action = response.get("action")
+        if action == "approve":
+            action = response.get("value") or confirmation.get("defaultOption")
+        elif action in ("reject", "cancel"):
+            action = confirmation.get("rejectOption", "reject")
+        self.confirmation_result = {**response, "action": action}
+        return self.confirmation_result
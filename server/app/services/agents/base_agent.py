@@ -1,14 +1,26 @@
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
+from contextvars import ContextVar
+from datetime import datetime
 import asyncio
+import time
+import uuid
 from langchain_core.tools import BaseTool
 from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
 from app.core.llm_factory import llm_factory
 from app.core.tool_registry import tool_registry
+from app.core.llm_cache import llm_response_cache
+from app.core.event_publisher import event_publisher
+from app.core.config import settings
+from app.services.agents.context_builder import context_builder
 from app.core.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Diagnosis session the current workflow node runs for; set by the workflow engine
+current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
+
 class AgentTimeoutError(Exception):
     """Raised when agent execution times out"""
     pass
@@ -21,6 +33,7 @@ class BaseAgent(ABC):
         self.llm: Optional[BaseChatModel] = None
         self.tools: List[BaseTool] = []
         self.retry_count = 3
+        self.context_tokens_saved = 0
 
     def initialize(self):
         """Initialize agent with LLM and tools"""
@@ -32,6 +45,89 @@ class BaseAgent(ABC):
             logger.error(f"Failed to initialize agent {self.agent_name}: {e}")
             raise
 
+    def _model_name(self) -> str:
+        return getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None) or type(self.llm).__name__
+
+    def _render_context(self, context: Dict[str, Any]) -> str:
+        """Serialize context for the prompt within the model's token budget"""
+        built = context_builder.build(context, self._model_name())
+        self.context_tokens_saved += built.tokens_saved
+        if built.tokens_saved:
+            logger.info(f"{self.agent_name} context: {built.tokens}/{built.budget} tokens, "
+                        f"saved {built.tokens_saved} of {built.original_tokens}")
+        return built.text
+
+    async def _invoke_llm(self, messages: List[BaseMessage]) -> str:
+        """Call the LLM, answering from the response cache when this agent opted in"""
+        use_cache = llm_response_cache.enabled_for(self.agent_type)
+        if use_cache:
+            model = self._model_name()
+            prompt = "\n".join(f"{message.type}: {message.content}" for message in messages)
+            cached = llm_response_cache.get(self.agent_type, model, prompt)
+            if cached is not None:
+                logger.info(f"{self.agent_name} answered from LLM cache")
+                self._publish_message(str(uuid.uuid4()), cached, done=True)
+                return cached
+
+        session_id = current_session_id.get()
+        if settings.agent_stream_enabled and session_id:
+            content = await self._stream_llm(messages)
+        else:
+            response = await self.llm.ainvoke(messages)
+            content = response.content
+        if use_cache and isinstance(content, str):
+            llm_response_cache.put(self.agent_type, model, prompt, content)
+        return content
+
+    async def _stream_llm(self, messages: List[BaseMessage]) -> str:
+        """Stream the response, forwarding coalesced deltas as agent_message events"""
+        message_id = str(uuid.uuid4())
+        interval = settings.agent_stream_interval_ms / 1000
+        parts: List[str] = []
+        pending: List[str] = []
+        last_sent = time.monotonic()
+
+        completed = False
+        try:
+            async for chunk in self.llm.astream(messages):
+                text = chunk.content if isinstance(chunk.content, str) else ""
+                if not text:
+                    continue
+                parts.append(text)
+                pending.append(text)
+                if time.monotonic() - last_sent >= interval:
+                    self._publish_message(message_id, "".join(pending), done=False)
+                    pending.clear()
+                    last_sent = time.monotonic()
+            completed = True
+        finally:
+            # Cancelled, timed out (and maybe retried) or failed: still close the message
+            self._publish_message(message_id, "".join(pending), done=True, aborted=not completed)
+        return "".join(parts)
+
+    def _publish_message(self, message_id: str, content: str, done: bool, aborted: bool = False):
+        session_id = current_session_id.get()
+        if not session_id:
+            return
+        data = {
+            "id": message_id,
+            "agent": self.agent_type,
+            "timestamp": datetime.now().strftime("%H:%M:%S"),
+            "content": content,
+            "type": "info",
+            "delta": True,
+            "done": done
+        }
+        if aborted:
+            data["aborted"] = True
+        event_publisher.publish_diagnosis_event(session_id, {
+            "type": "agent_message",
+            "data": data,
+            "timestamp": datetime.now().isoformat()
+        })
+        if done:
+            event_publisher.flush()
+
     async def execute_with_timeout(self, task: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Execute agent task with timeout and retry logic"""
         for attempt in range(self.retry_count):
@@ -0,0 +1,166 @@
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+import hashlib
+import json
+from app.core.config import settings
+from app.core.logging_config import get_logger
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a character-based estimate
+    tiktoken = None
+
+logger = get_logger(__name__)
+
+# Prompt context budget (tokens) for each model in TOKEN_PRICING; other models
+# use AGENT_CONTEXT_TOKEN_BUDGET, and AGENT_CONTEXT_MODEL_BUDGETS overrides both
+DEFAULT_MODEL_BUDGETS = {
+    "gpt-4-turbo": 12000,
+    "gpt-4": 4000,
+    "gpt-3.5-turbo": 6000,
+    "claude-3-5-sonnet-20241022": 12000,
+    "claude-3-opus-20240229": 12000,
+}
+
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARKER = " …[truncated {} tokens]"
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Token count via tiktoken when installed, otherwise ~4 characters per token"""
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return len(encoding.encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Keep the head of text within max_tokens, noting how much was cut"""
+    total = count_tokens(text, model)
+    if total <= max_tokens:
+        return text
+    # Shrink proportionally; a second pass corrects estimation error
+    keep = text[:max(int(len(text) * max_tokens / total), 0)]
+    while keep and count_tokens(keep, model) > max_tokens:
+        keep = keep[:int(len(keep) * 0.9)]
+    return keep.rstrip() + TRUNCATION_MARKER.format(total - count_tokens(keep, model))
+
+
+@dataclass
+class BuiltContext:
+    text: str
+    tokens: int
+    original_tokens: int
+    budget: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.original_tokens - self.tokens, 0)
+
+
+class ContextBuilder:
+    """Compact, token-budgeted rendering of agent context.
+
+    Scalar fields are rendered one per line. Evidence items become one
+    "[source/status] result" block each, repeated paragraphs across sources
+    are dropped, and when the total exceeds the model budget the remaining
+    budget is shared between sources, with short sources leaving their
+    unused share to longer ones.
+    """
+
+    def budget_for(self, model: Optional[str]) -> int:
+        overrides = settings.agent_context_model_budgets_map
+        if model in overrides:
+            return overrides[model]
+        return DEFAULT_MODEL_BUDGETS.get(model, settings.agent_context_token_budget)
+
+    def build(self, context: Dict[str, Any], model: Optional[str] = None) -> BuiltContext:
+        budget = self.budget_for(model)
+        original_tokens = count_tokens(str(context), model)
+
+        header_lines = []
+        sources: List[Tuple[str, str]] = []
+        for key, value in context.items():
+            if key == "evidence" and isinstance(value, list):
+                sources.extend(self._evidence_sources(value))
+            else:
+                header_lines.append(f"{key}: {self._compact(value)}")
+        sources = self._dedupe(sources)
+
+        header = "\n".join(header_lines)
+        remaining = budget - count_tokens(header, model)
+        blocks = self._fit(sources, remaining, model)
+        text = "\n".join(part for part in [header, *blocks] if part)
+        return BuiltContext(text=text, tokens=count_tokens(text, model),
+                            original_tokens=original_tokens, budget=budget)
+
+    @staticmethod
+    def _compact(value: Any) -> str:
+        if isinstance(value, str):
+            return value
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+    def _evidence_sources(self, evidence: List[Any]) -> List[Tuple[str, str]]:
+        sources = []
+        for item in evidence:
+            if not isinstance(item, dict):
+                sources.append(("evidence", self._compact(item)))
+                continue
+            data = item.get("data")
+            source = item.get("type", "evidence")
+            if isinstance(data, dict):
+                label = f"{source}/{data.get('status', 'unknown')}"
+                body = data.get("result", data)
+            else:
+                label, body = source, data
+            sources.append((label, self._compact(body)))
+        return sources
+
+    @staticmethod
+    def _dedupe(sources: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        seen = set()
+        deduped = []
+        for label, body in sources:
+            paragraphs = []
+            for paragraph in body.split("\n\n"):
+                digest = hashlib.sha1(" ".join(paragraph.split()).lower().encode()).hexdigest()
+                if paragraph.strip() and digest in seen:
+                    continue
+                seen.add(digest)
+                paragraphs.append(paragraph)
+            text = "\n\n".join(paragraphs).strip()
+            if text:
+                deduped.append((label, text))
+        return deduped
+
+    @staticmethod
+    def _fit(sources: List[Tuple[str, str]], budget: int, model: Optional[str]) -> List[str]:
+        blocks = [f"[{label}] {body}" for label, body in sources]
+        sizes = [count_tokens(block, model) for block in blocks]
+        if sum(sizes) <= budget or not blocks:
+            return blocks
+
+        # Water-fill: sources under the fair share keep everything
+        allowance = [0] * len(blocks)
+        open_indexes = set(range(len(blocks)))
+        left = max(budget, 0)
+        while open_indexes:
+            share = left // len(open_indexes)
+            small = [i for i in open_indexes if sizes[i] <= share]
+            if not small:
+                for i in open_indexes:
+                    allowance[i] = share
+                break
+            for i in small:
+                allowance[i] = sizes[i]
+                left -= sizes[i]
+                open_indexes.discard(i)
+
+        return [truncate_to_tokens(block, allowance[i], model) if sizes[i] > allowance[i] else block
+                for i, block in enumerate(blocks)]
+
+
+context_builder = ContextBuilder()
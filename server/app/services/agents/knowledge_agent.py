@@ -29,12 +29,12 @@ class KnowledgeAgent(BaseAgent):
 
         try:
             prompt = ChatPromptTemplate.from_template(KNOWLEDGE_AGENT_PROMPT)
-            messages = prompt.format_messages(task=task, context=str(context))
-            response = await self.llm.ainvoke(messages)
+            messages = prompt.format_messages(task=task, context=self._render_context(context))
+            content = await self._invoke_llm(messages)
 
             return {
                 "agent": self.agent_name,
-                "result": response.content,
+                "result": content,
                 "status": "success"
             }
         except Exception as e:
@@ -0,0 +1,224 @@
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+import asyncio
+import base64
+import json
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    WRITES_IDX_MAP,
+    get_checkpoint_id,
+)
+from app.core.redis_client import redis_client
+from app.core.config import settings
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+CHECKPOINT_KEY_PREFIX = "workflow_checkpoint:"
+WRITES_KEY_PREFIX = "workflow_checkpoint_writes:"
+
+
+class RedisCheckpointSaver(BaseCheckpointSaver):
+    """LangGraph checkpointer storing per-node workflow state in Redis.
+
+    Checkpoints for a thread (the diagnosis session id) live in one hash
+    keyed by checkpoint id; pending writes of each checkpoint in another.
+    Checkpoint ids are time-ordered, so the latest is the greatest. Keys
+    expire after workflow_checkpoint_ttl and are deleted once a diagnosis
+    finishes, so only interrupted runs keep state around.
+    """
+
+    def __init__(self, ttl: Optional[int] = None):
+        super().__init__()
+        self.redis = redis_client.get_client()
+        self.ttl = ttl or settings.workflow_checkpoint_ttl
+
+    @staticmethod
+    def _checkpoint_key(thread_id: str, checkpoint_ns: str) -> str:
+        return f"{CHECKPOINT_KEY_PREFIX}{thread_id}:{checkpoint_ns}"
+
+    @staticmethod
+    def _writes_key(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> str:
+        return f"{WRITES_KEY_PREFIX}{thread_id}:{checkpoint_ns}:{checkpoint_id}"
+
+    def _dump(self, value: Any) -> Dict[str, str]:
+        # The shared Redis pool decodes responses, so binary payloads travel as base64
+        type_, data = self.serde.dumps_typed(value)
+        return {"type": type_, "data": base64.b64encode(data).decode()}
+
+    def _load(self, payload: Dict[str, str]) -> Any:
+        return self.serde.loads_typed((payload["type"], base64.b64decode(payload["data"])))
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        key = self._checkpoint_key(thread_id, checkpoint_ns)
+
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id is None:
+            ids = self.redis.hkeys(key)
+            if not ids:
+                return None
+            checkpoint_id = max(ids)
+        raw = self.redis.hget(key, checkpoint_id)
+        if raw is None:
+            return None
+        return self._to_tuple(thread_id, checkpoint_ns, checkpoint_id, json.loads(raw))
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str,
+                  record: Dict[str, Any]) -> CheckpointTuple:
+        writes = self.redis.hgetall(self._writes_key(thread_id, checkpoint_ns, checkpoint_id))
+        pending_writes = []
+        for field in sorted(writes):
+            write = json.loads(writes[field])
+            pending_writes.append((write["task_id"], write["channel"], self._load(write["value"])))
+
+        parent_id = record.get("parent_id")
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint=self._load(record["checkpoint"]),
+            metadata=self._load(record["metadata"]),
+            parent_config={"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": parent_id,
+            }} if parent_id else None,
+            pending_writes=pending_writes,
+        )
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        if not config:
+            return
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        records = self.redis.hgetall(self._checkpoint_key(thread_id, checkpoint_ns))
+        before_id = get_checkpoint_id(before) if before else None
+
+        count = 0
+        for checkpoint_id in sorted(records, reverse=True):
+            if before_id and checkpoint_id >= before_id:
+                continue
+            checkpoint_tuple = self._to_tuple(thread_id, checkpoint_ns, checkpoint_id, json.loads(records[checkpoint_id]))
+            if filter and any(checkpoint_tuple.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yield checkpoint_tuple
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        key = self._checkpoint_key(thread_id, checkpoint_ns)
+        record = {
+            "checkpoint": self._dump(checkpoint),
+            "metadata": self._dump(metadata),
+            "parent_id": config["configurable"].get("checkpoint_id"),
+        }
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(key, checkpoint["id"], json.dumps(record))
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        logger.debug(f"Saved workflow checkpoint {checkpoint['id']} for {thread_id}")
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        key = self._writes_key(thread_id, checkpoint_ns, config["configurable"]["checkpoint_id"])
+
+        pipe = self.redis.pipeline(transaction=False)
+        for idx, (channel, value) in enumerate(writes):
+            write_idx = WRITES_IDX_MAP.get(channel, idx)
+            field = f"{task_id}:{write_idx}"
+            payload = json.dumps({"task_id": task_id, "channel": channel, "value": self._dump(value)})
+            if write_idx >= 0:
+                # Regular writes are immutable once recorded; special ones are replaced
+                pipe.hsetnx(key, field, payload)
+            else:
+                pipe.hset(key, field, payload)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def delete_thread(self, thread_id: str, checkpoint_ns: str = "") -> None:
+        """Drop every checkpoint and pending write of a thread"""
+        key = self._checkpoint_key(thread_id, checkpoint_ns)
+        checkpoint_ids = self.redis.hkeys(key)
+        keys = [key] + [self._writes_key(thread_id, checkpoint_ns, cid) for cid in checkpoint_ids]
+        self.redis.delete(*keys)
+
+    # The async variants run the blocking Redis calls and (de)serialization in
+    # an executor, so saving a checkpoint after each node doesn't stall other
+    # diagnoses sharing the worker's event loop.
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.put_writes, config, writes, task_id, task_path)
+
+
+diagnosis_checkpointer = RedisCheckpointSaver()
@@ -266,6 +266,7 @@ class MockDiagnosisAgent(BaseAgent):
                             {"label": "修改分析范围", "value": "modify"}
                         ],
                         "defaultOption": "continue",
+                        "rejectOption": "skip",
                         "riskLevel": "low",
                         "timeout": 300
                     },
@@ -275,11 +276,16 @@ class MockDiagnosisAgent(BaseAgent):
                 await callback(confirmation_request)
                 yield confirmation_request
                 
-                self.paused_for_confirmation = True
                 self.pending_confirmation = confirmation_request["data"]
                 
-                while self.paused_for_confirmation:
-                    await asyncio.sleep(0.5)
+                try:
+                    await self.wait_for_confirmation(
+                        (context or {}).get("session_id"),
+                        timeout=confirmation_request["data"]["timeout"]
+                    )
+                except TimeoutError:
+                    logger.warning("确认超时，按默认选项继续")
+                    self.confirmation_result = {"action": confirmation_request["data"]["defaultOption"]}
                 
                 if self.confirmation_result:
                     action = self.confirmation_result.get("action")
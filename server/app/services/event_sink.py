@@ -0,0 +1,179 @@
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import column, insert, table, text
+from sqlalchemy.orm import Session
+import json
+import os
+import threading
+import time
+from app.core.backoff import FlushBackoff
+from app.core.config import settings
+from app.core.database import session_scope
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+diagnosis_events_table = table(
+    "diagnosis_events",
+    column("session_id"),
+    column("event_type"),
+    column("event_data"),
+    column("sequence"),
+)
+
+# Reserve a block of count sequence numbers for a session in one statement;
+# the returned value is one past the end of the block
+ALLOCATE_SEQUENCES_SQL = text("""
+    INSERT INTO diagnosis_event_counters (session_id, next_sequence)
+    VALUES (:session_id, :count)
+    ON CONFLICT (session_id)
+    DO UPDATE SET next_sequence = diagnosis_event_counters.next_sequence + :count
+    RETURNING next_sequence
+""")
+
+PendingEvent = Tuple[str, str, Dict[str, Any]]
+
+
+class DiagnosisEventSink:
+    """Write-behind persistence of diagnosis_events.
+
+    Events are buffered and written in one multi-row INSERT and a single
+    commit when batch_size is reached, flush_interval after the first
+    buffered event, or on an explicit flush() (snapshots and terminal task
+    states). Sequence numbers are allocated per session and per flush from
+    diagnosis_event_counters, so several processes can log to the same
+    session without colliding. While flushes fail, retries back off
+    exponentially, errors are logged at most once a minute, and only the
+    newest max_buffer events are kept.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, flush_interval_ms: Optional[int] = None,
+                 max_buffer: Optional[int] = None):
+        self.batch_size = batch_size or settings.state_event_batch_size
+        self.flush_interval = (flush_interval_ms or settings.state_event_flush_interval_ms) / 1000
+        self.max_buffer = max_buffer or settings.state_event_max_buffer
+        self._backoff = FlushBackoff(self.flush_interval)
+        self.dropped = 0
+        self._buffer: List[PendingEvent] = []
+        self._last_sequence: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid: Optional[int] = None
+
+    def add(self, session_id: str, event_type: str, event_data: Dict[str, Any], db: Optional[Session] = None):
+        """Queue an event; flushes through db right away when the batch is full"""
+        with self._lock:
+            self._buffer.append((session_id, event_type, event_data))
+            if len(self._buffer) > self.max_buffer:
+                # Reported by the next (throttled) flush failure log
+                del self._buffer[0]
+                self.dropped += 1
+            # While failing, leave retries to the backed-off flusher
+            full = len(self._buffer) >= self.batch_size and not self._backoff.failures
+        if full:
+            self.flush(db)
+        else:
+            self._ensure_flusher()
+            self._pending.set()
+
+    def last_sequence(self, session_id: str) -> int:
+        """Highest sequence this process has written for session_id, -1 if none"""
+        with self._lock:
+            return self._last_sequence.get(session_id, -1)
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._last_sequence.pop(session_id, None)
+
+    def flush(self, db: Optional[Session] = None) -> int:
+        """Write all buffered events; returns the count written.
+
+        Uses db when given, otherwise a session of its own. A failed batch
+        is put back in front of the buffer for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                self._pending.clear()
+            if not batch:
+                return 0
+
+            try:
+                if db is not None:
+                    last = self._write(batch, db)
+                    db.commit()
+                else:
+                    with session_scope() as own_db:
+                        last = self._write(batch, own_db)
+            except Exception as e:
+                if db is not None:
+                    db.rollback()
+                log, suppressed = self._backoff.failure()
+                if log:
+                    logger.error(f"Failed to persist {len(batch)} diagnosis events "
+                                 f"({suppressed} failures not logged, {self.dropped} events dropped so far), "
+                                 f"retrying in {self._backoff.delay:.1f}s: {e}")
+                self._requeue(batch)
+                return 0
+
+            failures = self._backoff.success()
+            if failures:
+                logger.info(f"Diagnosis events persisted again after {failures} failed flushes")
+            with self._lock:
+                self._last_sequence.update(last)
+            logger.debug(f"Persisted {len(batch)} diagnosis events")
+            return len(batch)
+
+    def _requeue(self, batch: List[PendingEvent]):
+        with self._lock:
+            self._buffer[:0] = batch
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self.dropped += overflow
+        self._ensure_flusher()
+        self._pending.set()
+
+    def _write(self, batch: List[PendingEvent], db: Session) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for session_id, _, _ in batch:
+            counts[session_id] = counts.get(session_id, 0) + 1
+
+        next_sequence = {}
+        # Lock counter rows in one global order so concurrent flushers can't deadlock
+        for session_id, count in sorted(counts.items()):
+            end = db.execute(ALLOCATE_SEQUENCES_SQL, {"session_id": session_id, "count": count}).scalar_one()
+            next_sequence[session_id] = end - count
+
+        rows = []
+        for session_id, event_type, event_data in batch:
+            rows.append({
+                "session_id": session_id,
+                "event_type": event_type,
+                "event_data": json.dumps(event_data, default=str),
+                "sequence": next_sequence[session_id]
+            })
+            next_sequence[session_id] += 1
+        db.execute(insert(diagnosis_events_table).values(rows))
+        return {session_id: sequence - 1 for session_id, sequence in next_sequence.items()}
+
+    def _ensure_flusher(self):
+        # Celery forks workers after import, so the thread is started lazily per process
+        if self._flusher is not None and self._flusher.is_alive() and self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive() and self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._run_flusher, name="diagnosis-event-sink", daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            self._pending.wait()
+            time.sleep(self._backoff.delay)
+            self.flush()
+
+
+diagnosis_event_sink = DiagnosisEventSink()
@@ -1,12 +1,27 @@
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import get_db, session_scope
+from app.core.config import settings
 from app.core.logging_config import get_logger
+from app.services.event_sink import diagnosis_event_sink
+from app.services.state_store import BoundedStateStore
 import json
 
+try:
+    import zstandard
+except ImportError:  # Optional: checkpoints are stored as plain JSON without it
+    zstandard = None
+
 logger = get_logger(__name__)
 
+SNAPSHOT_ENCODING_JSON = "json"
+SNAPSHOT_ENCODING_ZSTD = "zstd"
+
+# Append-only fields are persisted as their new items, the rest by value
+LIST_FIELDS = ("messages", "timeline", "evidence")
+VALUE_FIELDS = ("hypothesis_tree", "confidence", "current_phase")
+
 class DiagnosisState:
     def __init__(self, session_id: str):
         self.session_id = session_id
@@ -16,6 +31,8 @@ class DiagnosisState:
         self.confidence: int = 0
         self.evidence: List[Dict[str, Any]] = []
         self.current_phase: str = "init"
+        # Sequence of the last diagnosis_events row applied to this state
+        self.last_sequence: int = -1
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -30,21 +47,78 @@ class DiagnosisState:
 
 class StateManager:
     def __init__(self):
-        self._memory_states: Dict[str, DiagnosisState] = {}
-        self._event_sequence: Dict[str, int] = {}
+        # Sessions owned by this process; running ones are pinned until release()
+        self._memory_states = BoundedStateStore(
+            max_entries=settings.state_store_max_sessions,
+            ttl=settings.state_store_idle_ttl,
+            on_evict=self._on_evict
+        )
+        # What has already been persisted per session, to compute deltas
+        self._persisted: Dict[str, Dict[str, Any]] = {}
+        self._events_since_checkpoint: Dict[str, int] = {}
+        # Recently reconstructed states of sessions not running in this process
+        self._hot_states = BoundedStateStore(
+            max_entries=settings.state_hot_cache_size,
+            ttl=settings.state_store_idle_ttl
+        )
 
     def get_state(self, session_id: str) -> Optional[DiagnosisState]:
         """Get current state from memory"""
         return self._memory_states.get(session_id)
 
-    def create_state(self, session_id: str) -> DiagnosisState:
-        """Create new diagnosis state"""
-        state = DiagnosisState(session_id)
-        self._memory_states[session_id] = state
-        self._event_sequence[session_id] = 0
-        logger.info(f"Created state for session: {session_id}")
+    def create_state(self, session_id: str, db: Optional[Session] = None) -> DiagnosisState:
+        """Create the state for a run of a session.
+
+        A retried or resumed run continues from what earlier attempts
+        persisted (the state still held here, or snapshot plus event tail
+        from db), so its next delta only carries new content.
+        """
+        state = self._memory_states.get(session_id)
+        if state is None and db is not None:
+            state = self._restore(session_id, db)
+        if state is None:
+            state = DiagnosisState(session_id)
+            self._persisted.pop(session_id, None)
+            self._events_since_checkpoint[session_id] = 0
+            logger.info(f"Created state for session: {session_id}")
+        else:
+            logger.info(f"Continuing persisted state for session: {session_id}")
+        self._memory_states.put(session_id, state, pin=True)
+        return state
+
+    def _restore(self, session_id: str, db: Session) -> Optional[DiagnosisState]:
+        """Rebuild a session from its snapshot and event tail, as the new persisted baseline"""
+        state = self.load_from_snapshot(session_id, db, register=False) or DiagnosisState(session_id)
+        replayed = self._replay_tail(state, state.last_sequence + 1, db)
+        if state.last_sequence < 0:
+            return None
+        self._mark_persisted(session_id, state)
+        self._events_since_checkpoint[session_id] = replayed
         return state
 
+    def release(self, session_id: str):
+        """Let a finished session's state be evicted once idle"""
+        self._memory_states.unpin(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Gauges of the in-memory stores of this process"""
+        self._memory_states.sweep()
+        self._hot_states.sweep()
+        return {
+            "sessions": self._memory_states.stats(),
+            "reconstructed": self._hot_states.stats()
+        }
+
+    def _on_evict(self, session_id: str, state: DiagnosisState):
+        # Nothing may be lost with the state: persist what the last save missed
+        if self._diff(session_id, state) or self._events_since_checkpoint.get(session_id, 0):
+            with session_scope() as db:
+                self._save(state, db, force=True)
+        self._persisted.pop(session_id, None)
+        self._events_since_checkpoint.pop(session_id, None)
+        diagnosis_event_sink.forget(session_id)
+        logger.info(f"Evicted state for session: {session_id}")
+
     def update_state(self, session_id: str, updates: Dict[str, Any]):
         """Update state in memory"""
         state = self._memory_states.get(session_id)
@@ -53,59 +127,123 @@ class StateManager:
                 if hasattr(state, key):
                     setattr(state, key, value)
 
-    def save_snapshot(self, session_id: str, db: Session):
-        """Save state snapshot to database"""
+    def save_snapshot(self, session_id: str, db: Session, force: bool = False):
+        """Persist state changes since the last save.
+
+        New content is appended as a state_delta event; a full compacted
+        checkpoint is written to diagnosis_sessions only once
+        state_snapshot_event_interval events have built up, or when forced
+        (e.g. at the end of a diagnosis).
+        """
         state = self._memory_states.get(session_id)
-        if not state:
-            return
+        if state:
+            self._save(state, db, force)
+
+    def _save(self, state: DiagnosisState, db: Session, force: bool):
+        session_id = state.session_id
+        delta = self._diff(session_id, state)
+        if delta:
+            self.record_event(session_id, "state_delta", delta, db)
+            self._mark_persisted(session_id, state)
+
+        pending = self._events_since_checkpoint.get(session_id, 0)
+        if force or pending >= settings.state_snapshot_event_interval:
+            # The checkpoint's watermark must cover every event queued so far
+            self.flush_events(db)
+            self._write_checkpoint(session_id, state, db)
+
+    def _diff(self, session_id: str, state: DiagnosisState) -> Dict[str, Any]:
+        persisted = self._persisted.get(session_id, {})
+        lengths = persisted.get("lengths", {})
+        values = persisted.get("values", {})
+
+        append = {}
+        updates = {}
+        for field in LIST_FIELDS:
+            items = getattr(state, field)
+            start = lengths.get(field, 0)
+            if len(items) > start:
+                append[field] = items[start:]
+            elif len(items) < start:
+                # The run restarted from scratch (e.g. a retried simple workflow)
+                updates[field] = items
+
+        for field in VALUE_FIELDS:
+            value = getattr(state, field)
+            if json.dumps(value, sort_keys=True, default=str) != values.get(field):
+                updates[field] = value
+
+        delta = {}
+        if append:
+            delta["append"] = append
+        if updates:
+            delta["set"] = updates
+        return delta
+
+    def _mark_persisted(self, session_id: str, state: DiagnosisState):
+        self._persisted[session_id] = {
+            "lengths": {field: len(getattr(state, field)) for field in LIST_FIELDS},
+            "values": {field: json.dumps(getattr(state, field), sort_keys=True, default=str) for field in VALUE_FIELDS},
+        }
 
+    def _write_checkpoint(self, session_id: str, state: DiagnosisState, db: Session):
+        """Upsert the compacted full state, zstd-compressed when large"""
         from sqlalchemy import text
-        snapshot_data = json.dumps(state.to_dict())
+        payload = json.dumps(state.to_dict(), default=str)
+        snapshot_data, snapshot_blob, encoding = payload, None, SNAPSHOT_ENCODING_JSON
+        if (zstandard is not None and settings.state_snapshot_compression == SNAPSHOT_ENCODING_ZSTD
+                and len(payload) >= settings.state_snapshot_compress_min_bytes):
+            snapshot_blob = zstandard.ZstdCompressor().compress(payload.encode())
+            snapshot_data, encoding = "{}", SNAPSHOT_ENCODING_ZSTD
 
         db.execute(
             text("""
-                INSERT INTO diagnosis_sessions (session_id, snapshot_data, snapshot_version)
-                VALUES (:session_id, :snapshot_data, 1)
+                INSERT INTO diagnosis_sessions (session_id, snapshot_data, snapshot_blob, snapshot_encoding,
+                                                last_event_sequence, snapshot_version)
+                VALUES (:session_id, :snapshot_data, :snapshot_blob, :snapshot_encoding, :last_event_sequence, 1)
                 ON CONFLICT (session_id)
                 DO UPDATE SET snapshot_data = :snapshot_data,
+                              snapshot_blob = :snapshot_blob,
+                              snapshot_encoding = :snapshot_encoding,
+                              last_event_sequence = :last_event_sequence,
                               snapshot_version = diagnosis_sessions.snapshot_version + 1,
                               updated_at = NOW()
             """),
-            {"session_id": session_id, "snapshot_data": snapshot_data}
-        )
-        db.commit()
-        logger.info(f"Saved snapshot for session: {session_id}")
-
-    def record_event(self, session_id: str, event_type: str, event_data: Dict[str, Any], db: Session):
-        """Record event to database"""
-        sequence = self._event_sequence.get(session_id, 0)
-        self._event_sequence[session_id] = sequence + 1
-
-        from sqlalchemy import text
-        db.execute(
-            text("""
-                INSERT INTO diagnosis_events (session_id, event_type, event_data, sequence)
-                VALUES (:session_id, :event_type, :event_data, :sequence)
-            """),
             {
                 "session_id": session_id,
-                "event_type": event_type,
-                "event_data": json.dumps(event_data),
-                "sequence": sequence
+                "snapshot_data": snapshot_data,
+                "snapshot_blob": snapshot_blob,
+                "snapshot_encoding": encoding,
+                # A restored state may not have logged anything from this process yet
+                "last_event_sequence": max(diagnosis_event_sink.last_sequence(session_id), state.last_sequence)
             }
         )
         db.commit()
+        self._events_since_checkpoint[session_id] = 0
+        logger.info(f"Saved compacted snapshot for session: {session_id} ({encoding}, {len(payload)} bytes)")
+
+    def record_event(self, session_id: str, event_type: str, event_data: Dict[str, Any], db: Session):
+        """Queue event for batched persistence; db is used if the batch fills up"""
+        self._events_since_checkpoint[session_id] = self._events_since_checkpoint.get(session_id, 0) + 1
+        diagnosis_event_sink.add(session_id, event_type, event_data, db)
+
+    def flush_events(self, db: Optional[Session] = None) -> int:
+        """Write queued events now; called at snapshots and terminal task states"""
+        return diagnosis_event_sink.flush(db)
 
-    def load_from_snapshot(self, session_id: str, db: Session) -> Optional[DiagnosisState]:
-        """Load state from latest snapshot"""
+    def load_from_snapshot(self, session_id: str, db: Session, register: bool = True) -> Optional[DiagnosisState]:
+        """Load state from latest snapshot; the state's last_sequence is the snapshot watermark"""
         from sqlalchemy import text
         result = db.execute(
-            text("SELECT snapshot_data FROM diagnosis_sessions WHERE session_id = :session_id ORDER BY created_at DESC LIMIT 1"),
+            text("""
+                SELECT snapshot_data, snapshot_blob, snapshot_encoding, last_event_sequence
+                FROM diagnosis_sessions WHERE session_id = :session_id ORDER BY created_at DESC LIMIT 1
+            """),
             {"session_id": session_id}
         ).fetchone()
 
         if result:
-            data = json.loads(result[0])
+            data = self._decode_snapshot(result[0], result[1], result[2])
             state = DiagnosisState(session_id)
             state.messages = data.get("messages", [])
             state.hypothesis_tree = data.get("hypothesis_tree", {})
@@ -113,18 +251,40 @@ class StateManager:
             state.confidence = data.get("confidence", 0)
             state.evidence = data.get("evidence", [])
             state.current_phase = data.get("current_phase", "init")
-            self._memory_states[session_id] = state
+            state.last_sequence = result[3]
+            if register:
+                self._mark_persisted(session_id, state)
+                self._events_since_checkpoint[session_id] = 0
+                self._memory_states.put(session_id, state)
             return state
         return None
 
+    @staticmethod
+    def _decode_snapshot(snapshot_data: Any, snapshot_blob: Optional[bytes], encoding: Optional[str]) -> Dict[str, Any]:
+        if encoding == SNAPSHOT_ENCODING_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Snapshot is zstd-compressed but the zstandard package is not installed")
+            return json.loads(zstandard.ZstdDecompressor().decompress(bytes(snapshot_blob)))
+        # psycopg2 already decodes JSONB columns
+        return snapshot_data if isinstance(snapshot_data, dict) else json.loads(snapshot_data)
+
     def replay_events(self, session_id: str, from_sequence: int, db: Session) -> Optional[DiagnosisState]:
         """Replay events from a specific sequence number"""
         state = self._memory_states.get(session_id)
-        if not state:
+        loaded = state is None
+        if loaded:
             state = self.load_from_snapshot(session_id, db)
             if not state:
                 return None
 
+        self._replay_tail(state, from_sequence, db)
+        if loaded:
+            # Everything in a state rebuilt from the database is already persisted
+            self._mark_persisted(session_id, state)
+        return state
+
+    def _replay_tail(self, state: DiagnosisState, from_sequence: int, db: Session) -> int:
+        """Apply events with sequence >= from_sequence; returns how many were applied"""
         from sqlalchemy import text
         events = db.execute(
             text("""
@@ -133,15 +293,16 @@ class StateManager:
                 WHERE session_id = :session_id AND sequence >= :from_sequence
                 ORDER BY sequence
             """),
-            {"session_id": session_id, "from_sequence": from_sequence}
+            {"session_id": state.session_id, "from_sequence": from_sequence}
         ).fetchall()
 
         for event in events:
             event_type, event_data_str, sequence = event
-            event_data = json.loads(event_data_str)
+            event_data = event_data_str if isinstance(event_data_str, dict) else json.loads(event_data_str)
             self._apply_event(state, event_type, event_data)
+            state.last_sequence = sequence
 
-        return state
+        return len(events)
 
     def _apply_event(self, state: DiagnosisState, event_type: str, event_data: Dict[str, Any]):
         """Apply event to state"""
@@ -153,15 +314,39 @@ class StateManager:
             state.evidence.append(event_data)
         elif event_type == "phase_changed":
             state.current_phase = event_data.get("phase", state.current_phase)
+        elif event_type == "state_delta":
+            for field, items in event_data.get("append", {}).items():
+                if field in LIST_FIELDS:
+                    getattr(state, field).extend(items)
+            for field, value in event_data.get("set", {}).items():
+                if field in VALUE_FIELDS or field in LIST_FIELDS:
+                    setattr(state, field, value)
 
     def get_current_state(self, session_id: str, db: Session) -> Optional[DiagnosisState]:
-        """Get current state with latest events"""
+        """Get current state with latest events.
+
+        Sessions running in this process are served from memory. Others are
+        rebuilt from the latest snapshot plus only the events logged after
+        its watermark, then kept in a small LRU so a reconnect just checks
+        for newer events.
+        """
         state = self._memory_states.get(session_id)
-        if not state:
-            state = self.load_from_snapshot(session_id, db)
-            if state:
-                # Replay events since snapshot
-                self.replay_events(session_id, 0, db)
+        if state:
+            return state
+
+        state = self._hot_states.get(session_id)
+        if state is None:
+            state = self.load_from_snapshot(session_id, db, register=False)
+            if state is None:
+                # No checkpoint yet: the event log alone describes the session
+                state = DiagnosisState(session_id)
+                if not self._replay_tail(state, 0, db):
+                    return None
+                self._hot_states.put(session_id, state)
+                return state
+
+        self._replay_tail(state, state.last_sequence + 1, db)
+        self._hot_states.put(session_id, state)
         return state
 
 state_manager = StateManager()
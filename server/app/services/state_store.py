@@ -0,0 +1,104 @@
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from collections import OrderedDict
+import json
+import threading
+import time
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+EvictionHook = Callable[[str, Any], None]
+
+
+class BoundedStateStore:
+    """LRU map of in-memory session states with an idle TTL.
+
+    Entries untouched for ttl seconds, and the least recently used ones
+    beyond max_entries, are evicted on the next write or sweep(). Pinned
+    entries (sessions still running in this process) are never evicted.
+    on_evict runs for every evicted entry, outside the store lock, before
+    the state is dropped for good, so it can persist a final snapshot.
+    """
+
+    def __init__(self, max_entries: int, ttl: int, on_evict: Optional[EvictionHook] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._pinned: Set[str] = set()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._entries
+
+    def get(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            self._entries[session_id] = (entry[0], time.monotonic())
+            self._entries.move_to_end(session_id)
+            return entry[0]
+
+    def put(self, session_id: str, state: Any, pin: bool = False):
+        with self._lock:
+            self._entries[session_id] = (state, time.monotonic())
+            self._entries.move_to_end(session_id)
+            if pin:
+                self._pinned.add(session_id)
+        self.sweep()
+
+    def unpin(self, session_id: str):
+        """Make a session evictable again, e.g. once its diagnosis finished"""
+        with self._lock:
+            self._pinned.discard(session_id)
+
+    def pop(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            self._pinned.discard(session_id)
+            entry = self._entries.pop(session_id, None)
+        return entry[0] if entry else None
+
+    def sweep(self) -> int:
+        """Evict idle and surplus entries; returns how many were evicted"""
+        now = time.monotonic()
+        with self._lock:
+            victims: List[Tuple[str, Any]] = []
+            evictable = [sid for sid in self._entries if sid not in self._pinned]
+            surplus = len(self._entries) - self.max_entries
+            for session_id in evictable:
+                state, last_access = self._entries[session_id]
+                if surplus > 0 or now - last_access >= self.ttl:
+                    victims.append((session_id, state))
+                    surplus -= 1
+            for session_id, _ in victims:
+                del self._entries[session_id]
+            self.evictions += len(victims)
+
+        for session_id, state in victims:
+            if self.on_evict is None:
+                continue
+            try:
+                self.on_evict(session_id, state)
+            except Exception as e:
+                logger.error(f"Eviction hook failed for session {session_id}: {e}")
+        return len(victims)
+
+    def stats(self) -> Dict[str, int]:
+        """Resident session count and approximate serialized size, for this process"""
+        with self._lock:
+            states = [state for state, _ in self._entries.values()]
+            pinned = len(self._pinned)
+            evictions = self.evictions
+        approx_bytes = 0
+        for state in states:
+            data = state.to_dict() if hasattr(state, "to_dict") else state
+            approx_bytes += len(json.dumps(data, default=str))
+        return {
+            "resident_sessions": len(states),
+            "pinned_sessions": pinned,
+            "approx_bytes": approx_bytes,
+            "evictions": evictions,
+        }
@@ -1,71 +1,173 @@
-from typing import TypedDict, List, Dict, Any, Optional
+from typing import TypedDict, List, Dict, Any, Optional, Tuple
+import asyncio
+import threading
 from langgraph.graph import StateGraph, END
 from app.services.agents.coordinator_agent import CoordinatorAgent
 from app.services.agents.log_agent import LogAgent
 from app.services.agents.code_agent import CodeAgent
 from app.services.agents.knowledge_agent import KnowledgeAgent
 from app.services.agents.metric_agent import MetricAgent
+from app.services.agents.base_agent import current_session_id
 from app.core.logging_config import get_logger
 from app.core.event_publisher import event_publisher
-from app.core.database import get_db
+from app.core.tool_registry import tool_registry
+from app.core.workflow_control import workflow_control
+from app.core.config import settings
+from app.core.broadcast import config_broadcast
+from app.core.llm_factory import LLM_PROVIDERS_TOPIC
+from app.core.database import session_scope
 from app.services.state_manager import state_manager
+from app.services.checkpointer import diagnosis_checkpointer
 
 logger = get_logger(__name__)
 
+# Bump whenever the graph topology or node wiring changes
+GRAPH_VERSION = 2
+
 class DiagnosisState(TypedDict):
+    session_id: str
     symptom: str
     messages: List[Dict[str, Any]]
     hypothesis_tree: Dict[str, Any]
     evidence: List[Dict[str, Any]]
+    missing_agents: List[str]
     confidence: int
     next_action: Optional[str]
     current_phase: str
     paused: bool
     cancelled: bool
 
-class DiagnosisWorkflowEngine:
+class DiagnosisAgents:
+    """One generation of the workflow's agents; replaced whole, never reset in place"""
+
     def __init__(self):
         self.coordinator = CoordinatorAgent()
         self.log_agent = LogAgent()
         self.code_agent = CodeAgent()
         self.knowledge_agent = KnowledgeAgent()
         self.metric_agent = MetricAgent()
+
+    def all(self) -> List[Any]:
+        return [self.coordinator, self.log_agent, self.code_agent, self.knowledge_agent, self.metric_agent]
+
+
+class DiagnosisWorkflowEngine:
+    def __init__(self):
+        self._agents = DiagnosisAgents()
         self.active_workflows: Dict[str, Dict[str, Any]] = {}
+        self._workflow_cache: Dict[Tuple[str, int, int], Any] = {}
+        self._cache_lock = threading.Lock()
+        self._config_version = 0
+        # Agents keep their LLM clients, so provider changes must rebuild them
+        config_broadcast.subscribe(LLM_PROVIDERS_TOPIC, self.invalidate_workflows)
+
+    # Nodes look agents up per call, so running workflows move to a new
+    # generation at their next agent call while in-flight calls finish on the
+    # old agents, whose LLM clients are left untouched.
+    @property
+    def coordinator(self) -> CoordinatorAgent:
+        return self._agents.coordinator
+
+    @property
+    def log_agent(self) -> LogAgent:
+        return self._agents.log_agent
+
+    @property
+    def code_agent(self) -> CodeAgent:
+        return self._agents.code_agent
+
+    @property
+    def knowledge_agent(self) -> KnowledgeAgent:
+        return self._agents.knowledge_agent
+
+    @property
+    def metric_agent(self) -> MetricAgent:
+        return self._agents.metric_agent
+
+    @property
+    def agents(self) -> List[Any]:
+        return self._agents.all()
+
+    def get_workflow(self, mode: str):
+        """Return the compiled workflow for a mode, building it once per configuration"""
+        config_version = self._config_version + tool_registry.version
+        key = (mode, GRAPH_VERSION, config_version)
+        workflow = self._workflow_cache.get(key)
+        if workflow is not None:
+            return workflow
+
+        with self._cache_lock:
+            workflow = self._workflow_cache.get(key)
+            if workflow is not None:
+                return workflow
+
+            stale = [k for k in self._workflow_cache if k[2] != config_version]
+            if stale:
+                # Agents hold tools/LLMs from the old configuration
+                self._agents = DiagnosisAgents()
+                for k in stale:
+                    del self._workflow_cache[k]
+
+            if mode == "simple":
+                workflow = self.create_simple_workflow()
+            else:
+                workflow = self.create_complex_workflow()
+            self._workflow_cache[key] = workflow
+            logger.info(f"Compiled workflow cached: mode={mode}, graph_version={GRAPH_VERSION}, config_version={config_version}")
+            return workflow
+
+    def invalidate_workflows(self):
+        """Force compiled workflows and agent clients to be rebuilt on next use.
+
+        Runs on the broadcast thread: builds a fresh agent generation and
+        swaps the references instead of mutating agents that may be mid-call.
+        """
+        agents = DiagnosisAgents()
+        with self._cache_lock:
+            self._agents = agents
+            self._config_version += 1
+            self._workflow_cache = {}
+        logger.info("Workflow cache invalidated")
 
     def pause_workflow(self, session_id: str) -> bool:
-        """Pause a running workflow"""
+        """Pause a workflow before its next node, in whichever process runs it"""
+        workflow_control.pause(session_id)
         if session_id in self.active_workflows:
             self.active_workflows[session_id]["paused"] = True
-            logger.info(f"Workflow paused: {session_id}")
-            return True
-        return False
+        logger.info(f"Workflow paused: {session_id}")
+        return True
 
     def resume_workflow(self, session_id: str) -> bool:
         """Resume a paused workflow"""
+        workflow_control.resume(session_id)
         if session_id in self.active_workflows:
             self.active_workflows[session_id]["paused"] = False
-            logger.info(f"Workflow resumed: {session_id}")
-            return True
-        return False
+        logger.info(f"Workflow resumed: {session_id}")
+        return True
 
     def cancel_workflow(self, session_id: str) -> bool:
-        """Cancel a running workflow"""
+        """Cancel a workflow in whichever process runs it; False if it is not running"""
         if session_id in self.active_workflows:
             self.active_workflows[session_id]["cancelled"] = True
-            logger.info(f"Workflow cancelled: {session_id}")
-            return True
-        return False
+        found = workflow_control.cancel(session_id)
+        logger.info(f"Workflow cancelled: {session_id}")
+        return found
 
     def create_simple_workflow(self):
         """Create simple centralized coordination workflow"""
         async def simple_flow(state: DiagnosisState) -> DiagnosisState:
-            if state.get("cancelled"):
+            if state.get("cancelled") or await workflow_control.checkpoint(state["session_id"]):
+                state["cancelled"] = True
                 return state
 
-            result = await self.coordinator.execute_with_timeout(
-                state["symptom"],
-                {"phase": "analysis"}
-            )
+            token = current_session_id.set(state.get("session_id"))
+            try:
+                result = await self.coordinator.execute_with_timeout(
+                    state["symptom"],
+                    {"phase": "analysis"}
+                )
+            finally:
+                current_session_id.reset(token)
             state["messages"].append(result)
             state["confidence"] = 50
             return state
@@ -76,11 +178,11 @@ class DiagnosisWorkflowEngine:
         """Create complex LangGraph workflow with multiple phases"""
         workflow = StateGraph(DiagnosisState)
 
-        workflow.add_node("coordinator_init", self._coordinator_init)
-        workflow.add_node("parallel_analysis", self._parallel_analysis)
-        workflow.add_node("coordinator_synthesis", self._coordinator_synthesis)
-        workflow.add_node("knowledge_match", self._knowledge_match)
-        workflow.add_node("final_decision", self._final_decision)
+        workflow.add_node("coordinator_init", self._instrument("coordinator_init", self._coordinator_init))
+        workflow.add_node("parallel_analysis", self._instrument("parallel_analysis", self._fanout_analysis))
+        workflow.add_node("coordinator_synthesis", self._instrument("coordinator_synthesis", self._coordinator_synthesis))
+        workflow.add_node("knowledge_match", self._instrument("knowledge_match", self._knowledge_match))
+        workflow.add_node("final_decision", self._instrument("final_decision", self._final_decision))
 
         workflow.set_entry_point("coordinator_init")
         workflow.add_edge("coordinator_init", "parallel_analysis")
@@ -96,19 +198,70 @@ class DiagnosisWorkflowEngine:
         workflow.add_edge("knowledge_match", "final_decision")
         workflow.add_edge("final_decision", END)
 
-        return workflow.compile()
+        checkpointer = diagnosis_checkpointer if settings.workflow_checkpointing else None
+        return workflow.compile(checkpointer=checkpointer)
+
+    @staticmethod
+    def workflow_config(session_id: str) -> Dict[str, Any]:
+        """LangGraph run config; the session id names the checkpoint thread"""
+        return {"configurable": {"thread_id": session_id}}
+
+    def has_checkpoint(self, session_id: str) -> bool:
+        """Whether an interrupted complex run of this session can be resumed"""
+        if not settings.workflow_checkpointing:
+            return False
+        return diagnosis_checkpointer.get_tuple(self.workflow_config(session_id)) is not None
+
+    def clear_checkpoint(self, session_id: str):
+        if settings.workflow_checkpointing:
+            diagnosis_checkpointer.delete_thread(session_id)
+
+    def _instrument(self, node_name: str, node):
+        """Wrap a graph node with enter/complete events and a publish flush at its boundary"""
+        async def run(state: DiagnosisState) -> DiagnosisState:
+            session_id = state.get("session_id", "unknown")
+            # Cooperative checkpoint: blocks while paused, stops on cancel
+            if state.get("cancelled") or await workflow_control.checkpoint(session_id):
+                state["cancelled"] = True
+                return state
+
+            event_publisher.publish_diagnosis_event(session_id, {
+                "type": "workflow_node_entered",
+                "node_name": node_name
+            })
+            token = current_session_id.set(state.get("session_id"))
+            try:
+                result = await node(state)
+            finally:
+                current_session_id.reset(token)
+                event_publisher.publish_diagnosis_event(session_id, {
+                    "type": "workflow_node_completed",
+                    "node_name": node_name
+                })
+                event_publisher.flush()
+            # Synchronous DB work: keep it off the loop shared with other diagnoses
+            await asyncio.get_running_loop().run_in_executor(None, self._persist_progress, session_id, result)
+            return result
+
+        return run
+
+    @staticmethod
+    def _persist_progress(session_id: str, state: DiagnosisState):
+        """Append what the node changed to the session's event log"""
+        if state_manager.get_state(session_id) is None:
+            return
+        try:
+            state_manager.update_state(session_id, dict(state))
+            with session_scope() as db:
+                state_manager.save_snapshot(session_id, db)
+        except Exception as e:
+            logger.warning(f"Failed to persist progress for {session_id}: {e}")
 
     async def _coordinator_init(self, state: DiagnosisState) -> DiagnosisState:
         """Initial symptom analysis"""
         if state.get("cancelled"):
             return state
 
-        session_id = state.get("session_id", "unknown")
-        event_publisher.publish_diagnosis_event(session_id, {
-            "type": "workflow_node_entered",
-            "node_name": "coordinator_init"
-        })
-
         result = await self.coordinator.execute_with_timeout(
             f"Analyze symptom: {state['symptom']}",
             {"phase": "init"}
@@ -116,28 +269,92 @@ class DiagnosisWorkflowEngine:
         state["messages"].append(result)
         state["current_phase"] = "analysis"
 
-        event_publisher.publish_diagnosis_event(session_id, {
-            "type": "workflow_node_completed",
-            "node_name": "coordinator_init"
-        })
-
         return state
 
-    async def _parallel_analysis(self, state: DiagnosisState) -> DiagnosisState:
-        """Run log and metric analysis in parallel"""
+    def _fanout_specialists(self, state: DiagnosisState) -> Dict[str, Any]:
+        """Coroutines for the configured specialist agents, keyed by agent name"""
+        symptom = state["symptom"]
+        specialists = {
+            "log": lambda: self.log_agent.execute_with_timeout(symptom, {"phase": "analysis"}),
+            "metric": lambda: self.metric_agent.execute_with_timeout(symptom, {"phase": "analysis"}),
+            "code": lambda: self.code_agent.execute_with_timeout(symptom, {"phase": "analysis"}),
+            "knowledge": lambda: self.knowledge_agent.execute_with_timeout("Find similar cases", {"symptom": symptom}),
+        }
+        selected = {}
+        for name in settings.diagnosis_fanout_agents_list:
+            if name not in specialists:
+                logger.warning(f"Unknown fan-out agent ignored: {name}")
+                continue
+            selected[name] = specialists[name]()
+        return selected
+
+    async def _fanout_analysis(self, state: DiagnosisState) -> DiagnosisState:
+        """Run all independent specialist agents concurrently.
+
+        Each agent gets its own deadline (DIAGNOSIS_AGENT_DEADLINES, falling
+        back to DIAGNOSIS_AGENT_DEADLINE). Once a quorum of agents has
+        finished, whether with a result, an error or a missed deadline,
+        stragglers get a short grace period and are then cancelled, so
+        synthesis proceeds on partial evidence instead of waiting for the
+        slowest agent.
+        """
         if state.get("cancelled"):
             return state
 
-        import asyncio
-        log_task = self.log_agent.execute_with_timeout(state["symptom"], {"phase": "analysis"})
-        metric_task = self.metric_agent.execute_with_timeout(state["symptom"], {"phase": "analysis"})
+        coros = self._fanout_specialists(state)
+        deadlines = {name: settings.agent_deadline(name) for name in coros}
+        tasks = {
+            asyncio.ensure_future(asyncio.wait_for(coro, timeout=deadlines[name])): name
+            for name, coro in coros.items()
+        }
+        quorum = min(max(settings.diagnosis_fanout_quorum, 1), len(tasks))
+        loop = asyncio.get_running_loop()
+        quorum_reached_at: Optional[float] = None
+        results: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        pending = set(tasks)
+
+        try:
+            while pending:
+                timeout = None
+                if quorum_reached_at is not None:
+                    timeout = quorum_reached_at + settings.diagnosis_fanout_grace - loop.time()
+                    if timeout <= 0:
+                        break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks[task]
+                    try:
+                        results[name] = task.result()
+                    except asyncio.TimeoutError:
+                        logger.warning(f"Agent {name} missed its {deadlines[name]}s deadline")
+                        missing.append(name)
+                    except Exception as e:
+                        logger.error(f"Agent {name} failed during fan-out: {e}")
+                        missing.append(name)
+                if quorum_reached_at is None and len(results) + len(missing) >= quorum:
+                    quorum_reached_at = loop.time()
+        finally:
+            for task in pending:
+                task.cancel()
+                missing.append(tasks[task])
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
 
-        log_result, metric_result = await asyncio.gather(log_task, metric_task)
-        state["messages"].extend([log_result, metric_result])
-        state["evidence"].extend([
-            {"type": "log", "data": log_result},
-            {"type": "metric", "data": metric_result}
-        ])
+        # Keep the configured agent order so evidence is stable across runs
+        for name in coros:
+            if name in results:
+                state["messages"].append(results[name])
+                state["evidence"].append({"type": name, "data": results[name]})
+        state["missing_agents"] = [name for name in coros if name in missing]
+
+        event_publisher.publish_diagnosis_event(state.get("session_id", "unknown"), {
+            "type": "fanout_completed",
+            "received": [name for name in coros if name in results],
+            "missing": state["missing_agents"]
+        })
+        if missing:
+            logger.info(f"Fan-out continuing with partial evidence, missing: {state['missing_agents']}")
         return state
 
     async def _coordinator_synthesis(self, state: DiagnosisState) -> DiagnosisState:
@@ -147,14 +364,15 @@ class DiagnosisWorkflowEngine:
 
         result = await self.coordinator.execute_with_timeout(
             "Synthesize analysis results",
-            {"evidence": state["evidence"]}
+            {"evidence": state["evidence"], "missing_agents": state.get("missing_agents", [])}
         )
         state["messages"].append(result)
-        state["confidence"] = 70
+        # Historical case matching already contributed when knowledge ran in the fan-out
+        state["confidence"] = 85 if self._has_evidence(state, "knowledge") else 70
         return state
 
     async def _knowledge_match(self, state: DiagnosisState) -> DiagnosisState:
-        """Match with historical cases"""
+        """Match with historical cases when the fan-out did not produce them"""
         if state.get("cancelled"):
             return state
 
@@ -181,8 +399,12 @@ class DiagnosisWorkflowEngine:
 
     def _should_query_knowledge(self, state: DiagnosisState) -> str:
         """Decide if knowledge query is needed"""
-        if state.get("cancelled"):
+        if state.get("cancelled") or self._has_evidence(state, "knowledge"):
             return "no"
         return "yes" if state["confidence"] < 80 else "no"
 
+    @staticmethod
+    def _has_evidence(state: DiagnosisState, evidence_type: str) -> bool:
+        return any(item.get("type") == evidence_type for item in state.get("evidence", []))
+
 workflow_engine = DiagnosisWorkflowEngine()
@@ -1,30 +1,63 @@
 from celery import Task
+from celery.signals import worker_init, worker_process_init
 from app.core.celery_app import celery_app
 from app.core.logging_config import get_logger
-from app.core.database import get_db
+from app.core.database import get_db, session_scope
 from app.services.workflow_engine import workflow_engine, DiagnosisState
 from app.services.state_manager import state_manager
 from app.core.event_publisher import event_publisher
-from typing import Dict, Any
+from app.core.async_runner import async_runner
+from app.core.workflow_control import workflow_control, WorkflowCancelled
+from app.core.config import settings
+from app.repositories.dashboard_stats_repository import DashboardStatsRepository
+from typing import Any, Awaitable, Dict, Optional
 import asyncio
 
 logger = get_logger(__name__)
+stats_repo = DashboardStatsRepository()
+
+def run_async(coro: Awaitable[Any]) -> Any:
+    """Run a workflow coroutine according to diagnosis_loop_mode"""
+    if settings.diagnosis_loop_mode == "persistent":
+        return async_runner.run(coro, timeout=settings.celery_task_timeout)
+    return asyncio.run(coro)
+
+def record_outcome(session_id: str, outcome: str, confidence: Optional[int] = None):
+    """Update dashboard statistics; never fails the diagnosis itself"""
+    try:
+        stats_repo.record_diagnosis_finished(session_id, outcome, confidence)
+    except Exception as e:
+        logger.warning(f"Failed to record {outcome} diagnosis in dashboard stats: {e}")
+
+@worker_init.connect
+@worker_process_init.connect
+def prewarm_workflows(**kwargs):
+    """Compile workflow graphs at worker start, off the per-request path"""
+    for mode in ("simple", "complex"):
+        try:
+            workflow_engine.get_workflow(mode)
+        except Exception as e:
+            logger.warning(f"Failed to pre-warm {mode} workflow: {e}")
 
 class DiagnosisTask(Task):
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         logger.error(f"Task {task_id} failed: {exc}")
-        session_id = kwargs.get("session_id")
+        session_id = kwargs.get("session_id") or (args[0] if args else None)
         if session_id:
+            workflow_control.finish(session_id)
+            record_outcome(session_id, "failed")
             event_publisher.publish_diagnosis_event(session_id, {
                 "type": "task_failed",
                 "task_id": task_id,
                 "error": str(exc)
             })
+            event_publisher.flush()
 
 @celery_app.task(bind=True, base=DiagnosisTask, max_retries=3)
 def run_diagnosis(self, session_id: str, symptom: str, mode: str = "simple") -> Dict[str, Any]:
     """Run diagnosis workflow as Celery task"""
     logger.info(f"Starting diagnosis task for session: {session_id}")
+    workflow_control.bind_task(session_id, self.request.id)
 
     try:
         # Update task progress
@@ -38,16 +71,25 @@ def run_diagnosis(self, session_id: str, symptom: str, mode: str = "simple") ->
             "task_id": self.request.id
         })
 
-        # Initialize state
-        state = state_manager.create_state(session_id)
+        # Counted once per run, even if the task is retried or redelivered
+        try:
+            stats_repo.record_diagnosis_started(session_id, symptom)
+        except Exception as e:
+            logger.warning(f"Failed to record started diagnosis in dashboard stats: {e}")
+
+        # Initialize state, continuing what an earlier attempt persisted
+        with session_scope() as db:
+            state_manager.create_state(session_id, db)
         self.update_state(state='PROGRESS', meta={'progress': 20, 'phase': 'workflow_execution'})
 
         # Create initial workflow state
         workflow_state: DiagnosisState = {
+            "session_id": session_id,
             "symptom": symptom,
             "messages": [],
             "hypothesis_tree": {},
             "evidence": [],
+            "missing_agents": [],
             "confidence": 0,
             "next_action": None,
             "current_phase": "init",
@@ -56,22 +98,34 @@ def run_diagnosis(self, session_id: str, symptom: str, mode: str = "simple") ->
         }
 
         # Run workflow
+        workflow = workflow_engine.get_workflow(mode)
         if mode == "simple":
-            workflow = workflow_engine.create_simple_workflow()
             self.update_state(state='PROGRESS', meta={'progress': 50, 'phase': 'simple_workflow'})
-            result = asyncio.run(workflow(workflow_state))
+            result = run_async(workflow_control.run_cancellable(session_id, workflow(workflow_state)))
         else:
-            workflow = workflow_engine.create_complex_workflow()
             self.update_state(state='PROGRESS', meta={'progress': 50, 'phase': 'complex_workflow'})
-            result = asyncio.run(workflow.ainvoke(workflow_state))
+            config = workflow_engine.workflow_config(session_id)
+            if workflow_engine.has_checkpoint(session_id):
+                # Retried or redelivered run: continue after the last completed node
+                logger.info(f"Resuming diagnosis workflow from checkpoint: {session_id}")
+                workflow_input = None
+            else:
+                workflow_input = workflow_state
+            result = run_async(workflow_control.run_cancellable(session_id, workflow.ainvoke(workflow_input, config)))
+        if result.get("cancelled"):
+            raise WorkflowCancelled(session_id)
 
         self.update_state(state='PROGRESS', meta={'progress': 80, 'phase': 'saving_results'})
 
         # Save final state
         db = next(get_db())
         state_manager.update_state(session_id, result)
-        state_manager.save_snapshot(session_id, db)
-        state_manager.record_event(session_id, "diagnosis_completed", {"result": result}, db)
+        state_manager.save_snapshot(session_id, db, force=True)
+        # The result itself is already in the log as state_delta events
+        state_manager.record_event(session_id, "diagnosis_completed", {
+            "confidence": result.get("confidence"),
+            "current_phase": result.get("current_phase")
+        }, db)
 
         # Persist task result
         from sqlalchemy import text
@@ -90,16 +144,49 @@ def run_diagnosis(self, session_id: str, symptom: str, mode: str = "simple") ->
         )
         db.commit()
 
+        workflow_engine.clear_checkpoint(session_id)
+        workflow_control.finish(session_id)
+        record_outcome(session_id, "completed", result.get("confidence"))
+
         # Publish completion event
         event_publisher.publish_diagnosis_event(session_id, {
             "type": "diagnosis_completed",
             "session_id": session_id,
             "confidence": result.get("confidence", 0)
         })
+        event_publisher.flush()
 
         logger.info(f"Diagnosis task completed for session: {session_id}")
         return {"status": "completed", "session_id": session_id, "result": result}
 
+    except WorkflowCancelled:
+        logger.info(f"Diagnosis task cancelled for session: {session_id}")
+        workflow_engine.clear_checkpoint(session_id)
+        workflow_control.finish(session_id)
+        record_outcome(session_id, "cancelled")
+        event_publisher.publish_diagnosis_event(session_id, {
+            "type": "diagnosis_cancelled",
+            "session_id": session_id,
+            "task_id": self.request.id
+        })
+        event_publisher.flush()
+        return {"status": "cancelled", "session_id": session_id}
+
     except Exception as e:
         logger.error(f"Diagnosis task error for session {session_id}: {e}")
         raise self.retry(exc=e, countdown=2 ** self.request.retries)
+
+    finally:
+        # Terminal (or retrying) state: don't leave logged progress in the buffer.
+        # The task binding stays while a retry is pending so cancel() can revoke it.
+        state_manager.flush_events()
+        state_manager.release(session_id)
+
+
+def submit_diagnosis(session_id: str, symptom: str, mode: str = "simple"):
+    """Queue a fresh run of a session and bind its task id for cancel(); blocking"""
+    workflow_control.reset(session_id)
+    workflow_engine.clear_checkpoint(session_id)
+    task = run_diagnosis.delay(session_id, symptom, mode)
+    workflow_control.bind_task(session_id, task.id)
+    return task
@@ -1,3 +1,6 @@
+import os
+os.environ.setdefault("DB_POOL_PROFILE", "script")
+
 from app.core.database import SessionLocal, engine, Base
 from app.models.user import User
 from app.core.security import get_password_hash
@@ -2,7 +2,7 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, Base, pool_stats
 from app.core.logging_config import setup_logging, get_logger
 from app.api.v1.api import api_router
 
@@ -44,12 +44,12 @@ async def health_check():
 
 @app.get("/health/db")
 async def health_check_db():
-    """Database health check endpoint"""
+    """Database health check endpoint, with connection pool statistics"""
     try:
         from sqlalchemy import text
         with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
-        return {"status": "healthy", "database": "connected"}
+        return {"status": "healthy", "database": "connected", "pool": pool_stats()}
     except Exception as e:
         logger.error(f"Database health check failed: {e}")
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
@@ -69,6 +69,42 @@ async def health_check_redis():
         return {"status": "unhealthy", "redis": "disconnected", "error": str(e)}
 
 
+@app.get("/health/websocket")
+async def health_check_websocket():
+    """WebSocket outbound queue depth and drop counters"""
+    from app.api.v1.endpoints.websocket import manager
+    return {"status": "healthy", "websocket": manager.stats()}
+
+
+@app.get("/health/llm-cache")
+async def health_check_llm_cache():
+    """Agent LLM response cache hit/miss counters across all processes"""
+    try:
+        from app.core.llm_cache import get_cluster_stats
+        return {"status": "healthy", "llm_cache": get_cluster_stats()}
+    except Exception as e:
+        logger.error(f"LLM cache stats failed: {e}")
+        return {"status": "unhealthy", "error": str(e)}
+
+
+@app.get("/health/response-cache")
+async def health_check_response_cache():
+    """API response cache hit/miss/304 counters and hit rate across all processes"""
+    try:
+        from app.core.response_cache import response_cache
+        return {"status": "healthy", "response_cache": response_cache.stats()}
+    except Exception as e:
+        logger.error(f"Response cache stats failed: {e}")
+        return {"status": "unhealthy", "error": str(e)}
+
+
+@app.get("/health/state")
+async def health_check_state():
+    """Resident diagnosis session states and their approximate size in this process"""
+    from app.services.state_manager import state_manager
+    return {"status": "healthy", "state": state_manager.stats()}
+
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("=" * 50)
@@ -90,6 +126,8 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    from app.core.event_subscriber import event_dispatcher
+    await event_dispatcher.stop()
     logger.info("AIOps 智能诊断平台关闭")
 
 
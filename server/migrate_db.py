@@ -1,3 +1,6 @@
+import os
+os.environ.setdefault("DB_POOL_PROFILE", "script")
+
 from app.core.database import SessionLocal, engine
 from sqlalchemy import text
 
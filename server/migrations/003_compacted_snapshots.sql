@@ -0,0 +1,7 @@
+-- Migration: Compacted, optionally compressed state snapshots
+-- Version: 003
+-- Description: Session state is persisted as state_delta events plus periodic
+-- compacted checkpoints; large checkpoints may be stored zstd-compressed
+
+ALTER TABLE diagnosis_sessions ADD COLUMN IF NOT EXISTS snapshot_blob BYTEA;
+ALTER TABLE diagnosis_sessions ADD COLUMN IF NOT EXISTS snapshot_encoding VARCHAR(16) NOT NULL DEFAULT 'json';
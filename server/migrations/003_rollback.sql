@@ -0,0 +1,6 @@
+-- Rollback: Compacted, optionally compressed state snapshots
+-- Note: sessions whose checkpoint was stored compressed keep only an empty
+-- snapshot_data after rollback; their state can be rebuilt from diagnosis_events
+
+ALTER TABLE diagnosis_sessions DROP COLUMN IF EXISTS snapshot_encoding;
+ALTER TABLE diagnosis_sessions DROP COLUMN IF EXISTS snapshot_blob;
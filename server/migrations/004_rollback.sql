@@ -0,0 +1,3 @@
+-- Rollback: Snapshot event watermark
+
+ALTER TABLE diagnosis_sessions DROP COLUMN IF EXISTS last_event_sequence;
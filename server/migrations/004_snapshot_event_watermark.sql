@@ -0,0 +1,6 @@
+-- Migration: Snapshot event watermark
+-- Version: 004
+-- Description: Record the last diagnosis_events sequence folded into each
+-- snapshot so state reconstruction only replays the events after it
+
+ALTER TABLE diagnosis_sessions ADD COLUMN IF NOT EXISTS last_event_sequence INT NOT NULL DEFAULT -1;
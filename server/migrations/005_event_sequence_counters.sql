@@ -0,0 +1,14 @@
+-- Migration: Database-allocated diagnosis event sequences
+-- Version: 005
+-- Description: Per-session counters from which event writers reserve blocks of
+-- sequence numbers, so several processes can log events for one session
+
+CREATE TABLE IF NOT EXISTS diagnosis_event_counters (
+    session_id VARCHAR(50) PRIMARY KEY,
+    next_sequence INT NOT NULL DEFAULT 0
+);
+
+-- Continue numbering after events that already exist
+INSERT INTO diagnosis_event_counters (session_id, next_sequence)
+SELECT session_id, MAX(sequence) + 1 FROM diagnosis_events GROUP BY session_id
+ON CONFLICT (session_id) DO NOTHING;
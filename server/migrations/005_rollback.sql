@@ -0,0 +1,3 @@
+-- Rollback: Database-allocated diagnosis event sequences
+
+DROP TABLE IF EXISTS diagnosis_event_counters;
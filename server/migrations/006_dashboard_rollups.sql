@@ -0,0 +1,46 @@
+-- Migration: Incrementally maintained dashboard statistics
+-- Version: 006
+-- Description: Outcome counters on dashboard_stats and hourly/daily rollup
+-- buckets, both updated as diagnoses start and finish
+
+ALTER TABLE dashboard_stats ADD COLUMN IF NOT EXISTS completed_cases INT DEFAULT 0;
+ALTER TABLE dashboard_stats ADD COLUMN IF NOT EXISTS failed_cases INT DEFAULT 0;
+ALTER TABLE dashboard_stats ADD COLUMN IF NOT EXISTS cancelled_cases INT DEFAULT 0;
+ALTER TABLE dashboard_stats ADD COLUMN IF NOT EXISTS total_resolution_seconds DOUBLE PRECISION DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS dashboard_rollups (
+    id SERIAL PRIMARY KEY,
+    granularity VARCHAR(8) NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    started INT NOT NULL DEFAULT 0,
+    completed INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    cancelled INT NOT NULL DEFAULT 0,
+    total_resolution_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    CONSTRAINT uq_dashboard_rollups_bucket UNIQUE (granularity, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_dashboard_rollups_bucket_start ON dashboard_rollups(bucket_start);
+
+-- One-time backfill of the counters from existing cases; afterwards they are
+-- only ever incremented
+INSERT INTO dashboard_stats (active_tasks, success_rate, total_cases)
+SELECT 0, 0, 0 WHERE NOT EXISTS (SELECT 1 FROM dashboard_stats);
+
+UPDATE dashboard_stats SET
+    total_cases = counts.total,
+    active_tasks = counts.investigating,
+    completed_cases = counts.resolved,
+    failed_cases = counts.failed,
+    cancelled_cases = counts.cancelled,
+    success_rate = CASE WHEN counts.resolved + counts.failed > 0
+                        THEN ROUND(100.0 * counts.resolved / (counts.resolved + counts.failed), 1)
+                        ELSE 0 END
+FROM (
+    SELECT COUNT(*) AS total,
+           COUNT(*) FILTER (WHERE status = 'investigating') AS investigating,
+           COUNT(*) FILTER (WHERE status = 'resolved') AS resolved,
+           COUNT(*) FILTER (WHERE status = 'failed') AS failed,
+           COUNT(*) FILTER (WHERE status = 'cancelled') AS cancelled
+    FROM cases
+) AS counts;
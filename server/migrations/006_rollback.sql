@@ -0,0 +1,7 @@
+-- Rollback: Incrementally maintained dashboard statistics
+
+DROP TABLE IF EXISTS dashboard_rollups;
+ALTER TABLE dashboard_stats DROP COLUMN IF EXISTS total_resolution_seconds;
+ALTER TABLE dashboard_stats DROP COLUMN IF EXISTS cancelled_cases;
+ALTER TABLE dashboard_stats DROP COLUMN IF EXISTS failed_cases;
+ALTER TABLE dashboard_stats DROP COLUMN IF EXISTS completed_cases;
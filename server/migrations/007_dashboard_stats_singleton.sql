@@ -0,0 +1,17 @@
+-- Migration: Singleton key for dashboard statistics
+-- Version: 007
+-- Description: The single dashboard_stats row is upserted on a unique
+-- singleton column instead of an explicit id, and the id sequence is moved
+-- past any row inserted with one
+
+ALTER TABLE dashboard_stats ADD COLUMN IF NOT EXISTS singleton BOOLEAN DEFAULT TRUE;
+
+-- Only the oldest row is the statistics row; any duplicates keep a NULL key
+UPDATE dashboard_stats SET singleton = (id = (SELECT MIN(id) FROM dashboard_stats));
+UPDATE dashboard_stats SET singleton = NULL WHERE singleton = FALSE;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_dashboard_stats_singleton ON dashboard_stats(singleton);
+
+SELECT setval(pg_get_serial_sequence('dashboard_stats', 'id'),
+              GREATEST((SELECT COALESCE(MAX(id), 0) FROM dashboard_stats), 1),
+              (SELECT COUNT(*) > 0 FROM dashboard_stats));
@@ -0,0 +1,4 @@
+-- Rollback: Singleton key for dashboard statistics
+
+DROP INDEX IF EXISTS uq_dashboard_stats_singleton;
+ALTER TABLE dashboard_stats DROP COLUMN IF EXISTS singleton;
@@ -0,0 +1,116 @@
+from app.services import event_sink
+from app.services.event_sink import ALLOCATE_SEQUENCES_SQL, DiagnosisEventSink
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar_one(self):
+        return self.value
+
+
+class FakeCounterSession:
+    """Stands in for the database: keeps diagnosis_event_counters in a dict
+    and records allocation order and inserted rows"""
+
+    def __init__(self, counters=None):
+        self.counters = dict(counters or {})
+        self.allocations = []
+        self.rows = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def execute(self, statement, params=None):
+        if statement is ALLOCATE_SEQUENCES_SQL:
+            session_id, count = params["session_id"], params["count"]
+            self.allocations.append((session_id, count))
+            self.counters[session_id] = self.counters.get(session_id, 0) + count
+            return FakeResult(self.counters[session_id])
+        self.rows.extend(statement)
+        return FakeResult(None)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FailingSession(FakeCounterSession):
+    def execute(self, statement, params=None):
+        raise RuntimeError("database unavailable")
+
+
+class FakeInsert:
+    def values(self, rows):
+        return rows
+
+
+def make_sink(monkeypatch, **kwargs):
+    monkeypatch.setattr(event_sink, "insert", lambda table: FakeInsert())
+    sink = DiagnosisEventSink(batch_size=kwargs.pop("batch_size", 100), flush_interval_ms=50, **kwargs)
+    # Flushes are driven by the tests, not the background thread
+    monkeypatch.setattr(sink, "_ensure_flusher", lambda: None)
+    return sink
+
+
+def sequences(rows, session_id):
+    return [row["sequence"] for row in rows if row["session_id"] == session_id]
+
+
+def test_sequences_are_contiguous_per_session(monkeypatch):
+    sink = make_sink(monkeypatch)
+    db = FakeCounterSession()
+    for index in range(3):
+        sink.add("b", "state_delta", {"i": index})
+        sink.add("a", "state_delta", {"i": index})
+
+    assert sink.flush(db) == 6
+    assert sequences(db.rows, "a") == [0, 1, 2]
+    assert sequences(db.rows, "b") == [0, 1, 2]
+    assert sink.last_sequence("a") == 2
+    assert sink.last_sequence("b") == 2
+    assert sink.last_sequence("c") == -1
+    assert db.commits == 1
+
+
+def test_sequences_continue_after_other_writers(monkeypatch):
+    sink = make_sink(monkeypatch)
+    # Another process already reserved 0-4 for this session
+    db = FakeCounterSession({"a": 5})
+    sink.add("a", "state_delta", {})
+    sink.add("a", "state_delta", {})
+    sink.flush(db)
+
+    assert sequences(db.rows, "a") == [5, 6]
+    assert sink.last_sequence("a") == 6
+
+
+def test_counter_rows_are_locked_in_session_order(monkeypatch):
+    sink = make_sink(monkeypatch)
+    db = FakeCounterSession()
+    for session_id in ("c", "a", "b", "a"):
+        sink.add(session_id, "state_delta", {})
+    sink.flush(db)
+
+    assert db.allocations == [("a", 2), ("b", 1), ("c", 1)]
+    # Rows keep the order the events were added in
+    assert [row["session_id"] for row in db.rows] == ["c", "a", "b", "a"]
+
+
+def test_failed_flush_requeues_within_the_buffer_cap(monkeypatch):
+    sink = make_sink(monkeypatch, max_buffer=3)
+    failing = FailingSession()
+    for index in range(3):
+        sink.add("a", "state_delta", {"i": index})
+
+    assert sink.flush(failing) == 0
+    assert failing.rollbacks == 1
+    sink.add("a", "state_delta", {"i": 3})
+    assert sink.dropped == 1
+
+    db = FakeCounterSession()
+    assert sink.flush(db) == 3
+    assert [row["event_data"] for row in db.rows] == ['{"i": 1}', '{"i": 2}', '{"i": 3}']
+    assert sequences(db.rows, "a") == [0, 1, 2]
@@ -0,0 +1,63 @@
+import asyncio
+from app.core.send_queue import SendQueue
+
+
+def drain(queue):
+    async def take_all():
+        return [await queue.get() for _ in range(len(queue))]
+    return asyncio.run(take_all())
+
+
+def message(message_type, **data):
+    return {"type": message_type, "data": data}
+
+
+def test_coalesced_update_replaces_the_queued_one_in_place():
+    queue = SendQueue(maxsize=10)
+    queue.put(message("confidence_update", value=10))
+    queue.put(message("agent_message", content="a"))
+    queue.put(message("confidence_update", value=20))
+
+    assert [m["type"] for m in drain(queue)] == ["confidence_update", "agent_message"]
+    assert queue.coalesced == 1
+
+
+def test_update_after_delivery_is_queued_again():
+    queue = SendQueue(maxsize=10)
+    queue.put(message("confidence_update", value=10))
+    assert drain(queue)[0]["data"] == {"value": 10}
+
+    queue.put(message("confidence_update", value=20))
+    assert drain(queue)[0]["data"] == {"value": 20}
+    assert queue.coalesced == 0
+
+
+def test_droppable_message_is_discarded_when_full():
+    queue = SendQueue(maxsize=2)
+    queue.put(message("agent_message", content="a"))
+    queue.put(message("agent_message", content="b"))
+
+    assert queue.put(message("heartbeat")) is True
+    assert queue.dropped == 1
+    assert [m["data"]["content"] for m in drain(queue)] == ["a", "b"]
+
+
+def test_oldest_droppable_is_evicted_for_a_message_that_must_be_delivered():
+    queue = SendQueue(maxsize=3)
+    queue.put(message("workflow_node_entered", node="a"))
+    queue.put(message("agent_message", content="x"))
+    queue.put(message("workflow_node_entered", node="b"))
+
+    assert queue.put(message("diagnosis_completed")) is True
+    assert [m["type"] for m in drain(queue)] == ["agent_message", "workflow_node_entered", "diagnosis_completed"]
+    assert queue.lagging_for() == 0.0
+
+
+def test_put_refuses_when_nothing_can_be_dropped():
+    queue = SendQueue(maxsize=2)
+    queue.put(message("agent_message", content="a"))
+    queue.put(message("agent_message", content="b"))
+
+    assert queue.put(message("diagnosis_completed")) is False
+    assert len(queue) == 2
+    assert queue.full_since is not None
@@ -0,0 +1,154 @@
+import json
+from app.services.state_manager import DiagnosisState, StateManager
+
+
+def replay(events, session_id="s1"):
+    """Rebuild a state from scratch by applying logged events in order"""
+    manager = StateManager()
+    state = DiagnosisState(session_id)
+    for event_type, event_data in events:
+        # Events are stored as JSON, so replay what a round trip yields
+        manager._apply_event(state, event_type, json.loads(json.dumps(event_data)))
+    return state
+
+
+def save_delta(manager, state, log):
+    delta = manager._diff(state.session_id, state)
+    if delta:
+        log.append(("state_delta", delta))
+        manager._mark_persisted(state.session_id, state)
+    return delta
+
+
+def test_diff_appends_only_new_items():
+    manager = StateManager()
+    state = DiagnosisState("s1")
+    log = []
+    state.messages.append({"content": "first"})
+    state.confidence = 40
+    save_delta(manager, state, log)
+
+    state.messages.append({"content": "second"})
+    state.evidence.append({"type": "log"})
+    delta = save_delta(manager, state, log)
+
+    assert delta == {"append": {"messages": [{"content": "second"}], "evidence": [{"type": "log"}]}}
+    assert save_delta(manager, state, log) == {}
+
+
+def test_diff_sets_changed_values():
+    manager = StateManager()
+    state = DiagnosisState("s1")
+    log = []
+    save_delta(manager, state, log)
+
+    state.current_phase = "analysis"
+    state.hypothesis_tree = {"root": {"children": []}}
+    delta = save_delta(manager, state, log)
+
+    assert delta == {"set": {"current_phase": "analysis", "hypothesis_tree": {"root": {"children": []}}}}
+
+
+def test_replayed_deltas_rebuild_the_state():
+    manager = StateManager()
+    state = DiagnosisState("s1")
+    log = []
+    for step in range(3):
+        state.messages.append({"step": step})
+        state.timeline.append({"event": f"step {step}"})
+        state.confidence = 30 + step * 20
+        save_delta(manager, state, log)
+    state.current_phase = "synthesis"
+    save_delta(manager, state, log)
+
+    assert replay(log).to_dict() == state.to_dict()
+
+
+def test_shrunk_list_is_replaced_on_replay():
+    manager = StateManager()
+    state = DiagnosisState("s1")
+    log = []
+    state.messages.extend([{"run": 1}, {"run": 1}])
+    save_delta(manager, state, log)
+
+    # A retried run starts over with fewer items than were persisted
+    state.messages = [{"run": 2}]
+    delta = save_delta(manager, state, log)
+
+    assert delta == {"set": {"messages": [{"run": 2}]}}
+    assert replay(log).messages == [{"run": 2}]
+
+
+class FakeLogSession:
+    """Serves one snapshot row and the diagnosis_events log, honouring the
+    sequence filter of tail-replay queries"""
+
+    def __init__(self, snapshot=None, watermark=-1, events=()):
+        self.snapshot = snapshot
+        self.watermark = watermark
+        self.events = list(events)
+        self.event_queries = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if "FROM diagnosis_sessions" in sql:
+            row = (self.snapshot, None, "json", self.watermark) if self.snapshot is not None else None
+            return FakeRows([row] if row else [])
+        if "FROM diagnosis_events" in sql:
+            self.event_queries.append(params["from_sequence"])
+            return FakeRows([
+                (event_type, json.dumps(data), sequence)
+                for sequence, (event_type, data) in enumerate(self.events)
+                if sequence >= params["from_sequence"]
+            ])
+        raise AssertionError(f"Unexpected statement: {sql}")
+
+
+class FakeRows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_reconstruction_replays_only_events_after_the_watermark():
+    events = [
+        ("state_delta", {"append": {"messages": [{"n": 0}]}}),
+        ("state_delta", {"append": {"messages": [{"n": 1}]}}),
+        ("state_delta", {"append": {"messages": [{"n": 2}]}, "set": {"confidence": 80}}),
+    ]
+    # The snapshot already contains events 0 and 1
+    snapshot = {"messages": [{"n": 0}, {"n": 1}], "confidence": 50, "current_phase": "analysis"}
+    db = FakeLogSession(snapshot, watermark=1, events=events)
+    manager = StateManager()
+
+    state = manager.get_current_state("s1", db)
+
+    assert db.event_queries == [2]
+    assert state.messages == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert state.confidence == 80
+    assert state.last_sequence == 2
+
+
+def test_cached_reconstruction_applies_only_newer_events():
+    events = [("state_delta", {"append": {"timeline": [{"n": 0}]}})]
+    db = FakeLogSession(events=events)
+    manager = StateManager()
+
+    # No checkpoint yet: the whole log is replayed
+    assert manager.get_current_state("s1", db).timeline == [{"n": 0}]
+
+    db.events.append(("state_delta", {"append": {"timeline": [{"n": 1}]}}))
+    state = manager.get_current_state("s1", db)
+
+    assert db.event_queries == [0, 1]
+    assert state.timeline == [{"n": 0}, {"n": 1}]
+    assert state.last_sequence == 1
+
+
+def test_unknown_session_is_not_reconstructed():
+    assert StateManager().get_current_state("missing", FakeLogSession()) is None
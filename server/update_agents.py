@@ -1,3 +1,6 @@
+import os
+os.environ.setdefault("DB_POOL_PROFILE", "script")
+
 from app.core.database import SessionLocal
 from app.models.case import Agent
 
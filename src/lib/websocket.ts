@@ -11,9 +11,10 @@ export interface JSONRPCResponse {
 }
 
 export interface WSMessage {
-  type: 'agent_message' | 'action_proposal' | 'diagnosis_status' | 'error' | 'confirmation_required' | 'action_result' | 'timeline_update' | 'confidence_update' | 'agent_trace_start' | 'agent_trace_step' | 'agent_trace_complete';
+  type: 'connection_established' | 'agent_message' | 'action_proposal' | 'diagnosis_status' | 'error' | 'confirmation_required' | 'action_result' | 'timeline_update' | 'confidence_update' | 'agent_trace_start' | 'agent_trace_step' | 'agent_trace_complete';
   data: any;
   timestamp: string;
+  event_id?: string;
 }
 
 export interface AgentMessage {
@@ -66,6 +67,9 @@ class WebSocketService {
   private reconnectTimer: NodeJS.Timeout | null = null;
   private manualDisconnect = false;
   private connectingPromise: Promise<void> | null = null;
+  // Resume point sent when reconnecting, so the server replays missed events
+  private sessionId: string | null = null;
+  private lastEventId: string | null = null;
 
   constructor(url: string = 'ws://localhost:8000/api/v1/agent/ws') {
     this.url = url;
@@ -89,7 +93,7 @@ class WebSocketService {
     this.connectingPromise = new Promise((resolve, reject) => {
       try {
         this.setConnectionStatus('connecting');
-        this.ws = new WebSocket(this.url);
+        this.ws = new WebSocket(this.buildUrl());
 
         this.ws.onopen = () => {
           console.log('[WebSocket] Connected to agent CLI');
@@ -102,6 +106,7 @@ class WebSocketService {
         this.ws.onmessage = (event) => {
           try {
             const message: WSMessage = JSON.parse(event.data);
+            this.trackResumePoint(message);
             this.notifyHandlers(message);
           } catch (error) {
             console.error('[WebSocket] Failed to parse message:', error);
@@ -146,9 +151,31 @@ class WebSocketService {
     }
 
     this.connectingPromise = null;
+    this.sessionId = null;
+    this.lastEventId = null;
     this.setConnectionStatus('disconnected');
   }
 
+  private buildUrl(): string {
+    if (!this.sessionId) {
+      return this.url;
+    }
+    const params = new URLSearchParams({ session_id: this.sessionId });
+    if (this.lastEventId) {
+      params.set('last_event_id', this.lastEventId);
+    }
+    return `${this.url}?${params.toString()}`;
+  }
+
+  private trackResumePoint(message: WSMessage): void {
+    if (message.type === 'connection_established' && message.data?.session_id) {
+      this.sessionId = message.data.session_id;
+    }
+    if (message.event_id) {
+      this.lastEventId = message.event_id;
+    }
+  }
+
   private attemptReconnect(): void {
     if (this.manualDisconnect) {
       console.log('[WebSocket] Manual disconnect, skipping reconnect');
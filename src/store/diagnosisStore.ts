@@ -9,6 +9,9 @@ export interface AgentMessage {
   timestamp: string;
   content: string;
   type: 'info' | 'hypothesis' | 'action' | 'evidence' | 'decision' | 'error';
+  delta?: boolean;
+  done?: boolean;
+  aborted?: boolean;
 }
 
 export interface TimelineStep {
@@ -86,14 +89,18 @@ export const useDiagnosisStore = create<DiagnosisState>((set, get) => ({
       switch (message.type) {
         case 'agent_message': {
           const agentMsg = message.data as AgentMessage;
-          set((s) => ({
-            currentCase: s.currentCase
-              ? {
-                  ...s.currentCase,
-                  messages: [...s.currentCase.messages, agentMsg],
-                }
-              : null,
-          }));
+          set((s) => {
+            if (!s.currentCase) return { currentCase: null };
+            const messages = s.currentCase.messages;
+            const existing = agentMsg.delta ? messages.findIndex((m) => m.id === agentMsg.id) : -1;
+            // Streamed deltas extend the message they belong to
+            const next = existing >= 0
+              ? messages.map((m, i) => (i === existing
+                  ? { ...m, content: m.content + agentMsg.content, done: agentMsg.done, aborted: agentMsg.aborted }
+                  : m))
+              : [...messages, agentMsg];
+            return { currentCase: { ...s.currentCase, messages: next } };
+          });
           break;
         }
 